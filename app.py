@@ -1,15 +1,21 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_file, abort, Response, has_request_context
 import os
 import json
 import uuid
 from datetime import datetime
 import io
-import base64
+import hashlib
 from PIL import Image
+from image_store import ThumbnailStore
+from job_queue import GenerationQueue, JobQueueFull
+from events import EventBroadcaster
+from user_store import UserStore
+from interaction_log import InteractionLog
+from storage import SQLiteStorage
 
 # Import your existing gallery system
 try:
-    from main import VirtualGalleryManager, UserProfile, Artwork
+    from main import VirtualGalleryManager, UserProfile, Artwork, ImageEncoder
 except ImportError:
     print("Make sure main.py is in the same directory!")
     exit(1)
@@ -17,8 +23,61 @@ except ImportError:
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 
-# Initialize the gallery manager
-gallery_manager = VirtualGalleryManager()
+# Images are served as WebP where the browser accepts it, else JPEG or PNG
+image_encoder = ImageEncoder(preference=('webp', 'jpeg', 'png'), quality={'webp': 80, 'jpeg': 85})
+
+def new_user_profile(user_id):
+    """Profile every new session starts with"""
+    return UserProfile(
+        user_id=user_id,
+        preferred_styles=["digital", "abstract"],
+        preferred_colors=["vibrant", "cool"],
+        liked_artworks=[],
+        viewing_history=[],
+        interaction_weights={"style": 0.4, "color": 0.3, "tags": 0.3}
+    )
+
+# Render pool workers start by re-running the main script as __mp_main__;
+# they only render images, so neither the gallery nor the image store (whose
+# startup scan removes partly written files) is set up there
+RENDER_WORKER = __name__ == '__mp_main__'
+
+if not RENDER_WORKER:
+    # Rendered images are kept on disk and reused across requests and restarts
+    thumbnail_store = ThumbnailStore('image_cache', max_bytes=64 * 1024 * 1024)
+
+    # Every new session gets an anonymous profile; idle ones are evicted from
+    # memory (swept every 10 minutes), and those changed in any way from a new
+    # profile are kept on disk until they return
+    user_store = UserStore(UserProfile, max_users=10000, idle_ttl=24 * 3600, spill_directory='user_cache',
+                           default_profile=new_user_profile, sweep_interval=600)
+
+    # Changes are appended to a log rather than rewriting the whole gallery each
+    # time; the log is compacted into gallery_data.snap once it passes 4MB
+    interaction_log = InteractionLog('gallery_data.log', fsync='interval', fsync_interval=1.0,
+                                     compact_bytes=4 * 1024 * 1024)
+
+    # Snapshots are compacted into the binary gallery_data.snap; the JSON file is
+    # only read at startup until the first snapshot has been written
+    data_file = 'gallery_data.snap' if os.path.exists('gallery_data.snap') else 'gallery_data.json'
+
+    # Setting GALLERY_DB keeps artworks and users in that SQLite database instead,
+    # which is durable by itself. Run a single server process against it: the
+    # recommendation caches, tag index and dashboard counters live in the process
+    # and do not see writes made by another one
+    gallery_db = os.environ.get('GALLERY_DB')
+
+    # Initialize the gallery manager; in memory, artworks are kept in a columnar
+    # catalogue, which takes a fraction of the space of one object per artwork
+    if gallery_db:
+        gallery_manager = VirtualGalleryManager(image_store=thumbnail_store, image_encoder=image_encoder,
+                                                data_file=data_file,
+                                                storage=SQLiteStorage(gallery_db, Artwork, UserProfile))
+    else:
+        gallery_manager = VirtualGalleryManager(image_store=thumbnail_store, image_encoder=image_encoder,
+                                                user_store=user_store, data_file=data_file,
+                                                snapshot_file='gallery_data.snap', interaction_log=interaction_log,
+                                                columnar=True)
 
 def create_html_templates():
     """Create HTML template files"""
@@ -139,6 +198,11 @@ def create_html_templates():
             font-size: 3rem;
             position: relative;
         }
+        .artwork-image img {
+            width: 100%;
+            height: 100%;
+            object-fit: cover;
+        }
         .artwork-info {
             padding: 1.5rem;
         }
@@ -309,7 +373,11 @@ def create_html_templates():
     </div>
     <script>
         let likedArtworks = new Set();
+        let currentView = null;
+        let pendingJobId = null;
+        let pendingButton = null;
         async function loadRecommendations() {
+            currentView = 'recommendations';
             document.getElementById('section-title').textContent = 'AI Recommendations For You';
             document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading your personalized recommendations...</div>';
             try {
@@ -326,6 +394,7 @@ def create_html_templates():
             }
         }
         async function loadAllArtworks() {
+            currentView = 'all';
             document.getElementById('section-title').textContent = 'All Gallery Artworks';
             document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading all artworks...</div>';
             try {
@@ -349,35 +418,63 @@ def create_html_templates():
             }
             grid.innerHTML = '';
             artworks.forEach(artwork => {
-                const isLiked = likedArtworks.has(artwork.id);
-                const score = artwork.recommendation_score;
-                const artworkCard = document.createElement('div');
-                artworkCard.className = 'artwork-card';
-                artworkCard.innerHTML = `
-                    <div class="artwork-image" style="background-image: url('${artwork.image_data || artwork.image_url || ''}'); background-size: cover; background-position: center;">
-                        ${artwork.image_data || artwork.image_url ? '' : '🎨'}
-                        ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+                grid.appendChild(createArtworkCard(artwork, showScores));
+            });
+        }
+        function createArtworkCard(artwork, showScores = false) {
+            const isLiked = likedArtworks.has(artwork.id);
+            const score = artwork.recommendation_score;
+            const artworkCard = document.createElement('div');
+            artworkCard.className = 'artwork-card';
+            artworkCard.innerHTML = `
+                <div class="artwork-image">
+                    ${artwork.thumbnail_url ? `<img src="${artwork.thumbnail_url}" alt="${artwork.title}" loading="lazy">` : '🎨'}
+                    ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+                </div>
+                <div class="artwork-info">
+                    <div class="artwork-title">${artwork.title}</div>
+                    <div class="artwork-artist">by ${artwork.artist}</div>
+                    <div class="artwork-style">${artwork.style}</div>
+                    <div class="artwork-tags">
+                        ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
                     </div>
-                    <div class="artwork-info">
-                        <div class="artwork-title">${artwork.title}</div>
-                        <div class="artwork-artist">by ${artwork.artist}</div>
-                        <div class="artwork-style">${artwork.style}</div>
-                        <div class="artwork-tags">
-                            ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
-                        </div>
-                        <div class="artwork-actions">
-                            <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
-                                ${isLiked ? '❤️ Liked' : '🤍 Like'}
-                            </button>
-                        </div>
+                    <div class="artwork-actions">
+                        <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
+                            ${isLiked ? '❤️ Liked' : '🤍 Like'}
+                        </button>
                     </div>
-                `;
-                artworkCard.addEventListener('click', (e) => {
-                    if (e.target.tagName !== 'BUTTON') {
-                        viewArtwork(artwork.id);
+                </div>
+            `;
+            artworkCard.addEventListener('click', (e) => {
+                if (e.target.tagName !== 'BUTTON') {
+                    viewArtwork(artwork.id);
+                }
+            });
+            return artworkCard;
+        }
+        function connectEvents() {
+            // New artworks and generation progress are pushed by the server
+            const events = new EventSource('/api/events');
+            events.addEventListener('artwork_added', (e) => {
+                const artwork = JSON.parse(e.data);
+                if (currentView === 'all') {
+                    const grid = document.getElementById('artwork-grid');
+                    if (!grid.querySelector('.artwork-card')) {
+                        grid.innerHTML = '';
                     }
-                });
-                grid.appendChild(artworkCard);
+                    grid.appendChild(createArtworkCard(artwork, false));
+                }
+            });
+            events.addEventListener('job', (e) => {
+                const job = JSON.parse(e.data);
+                if (job.job_id !== pendingJobId || !pendingButton) {
+                    return;
+                }
+                if (job.status === 'queued') {
+                    pendingButton.textContent = `Queued (${job.queue_depth} in queue)...`;
+                } else if (job.status === 'running') {
+                    pendingButton.textContent = 'Rendering...';
+                }
             });
         }
         async function toggleLike(artworkId, button) {
@@ -435,6 +532,16 @@ def create_html_templates():
             document.getElementById('artTitle').value = '';
             document.getElementById('colorScheme').value = 'vibrant';
         }
+        async function waitForJob(statusUrl) {
+            // Long-poll the job until it has finished
+            while (true) {
+                const response = await fetch(`${statusUrl}?wait=25`);
+                const job = await response.json();
+                if (job.status !== 'queued' && job.status !== 'running') {
+                    return job;
+                }
+            }
+        }
         async function generateArt() {
             const title = document.getElementById('artTitle').value;
             const colorScheme = document.getElementById('colorScheme').value;
@@ -452,11 +559,19 @@ def create_html_templates():
                         style: colorScheme
                     })
                 });
-                const data = await response.json();
+                let data = await response.json();
+                if (data.status === 'queued') {
+                    pendingJobId = data.job_id;
+                    pendingButton = generateButton;
+                    data = await waitForJob(data.status_url);
+                }
                 if (data.status === 'success') {
                     alert(`Successfully generated: ${data.artwork.title}`);
                     hideGenerateModal();
-                    loadAllArtworks();
+                    // The new card is pushed over /api/events when already browsing all artworks
+                    if (currentView !== 'all') {
+                        loadAllArtworks();
+                    }
                 } else {
                     alert('Error generating artwork: ' + data.message);
                 }
@@ -464,6 +579,8 @@ def create_html_templates():
                 console.error('Error:', error);
                 alert('Error generating artwork');
             } finally {
+                pendingJobId = null;
+                pendingButton = null;
                 generateButton.disabled = false;
                 generateButton.textContent = 'Generate Artwork';
             }
@@ -475,6 +592,7 @@ def create_html_templates():
             }
         }
         window.onload = function() {
+            connectEvents();
             loadRecommendations();
         }
     </script>
@@ -546,6 +664,14 @@ def create_html_templates():
             border-radius: 20px;
             font-size: 0.9rem;
         }
+        .style-count {
+            background: white;
+            color: #667eea;
+            border-radius: 10px;
+            padding: 0 0.5rem;
+            margin-left: 0.4rem;
+            font-weight: bold;
+        }
         .back-btn {
             background: #667eea;
             color: white;
@@ -587,11 +713,19 @@ def create_html_templates():
                 <div class="stat-number">{{ stats.styles|length }}</div>
                 <div class="stat-label">Art Styles</div>
             </div>
+            <div class="stat-card">
+                <div class="stat-number">{{ stats.total_views }}</div>
+                <div class="stat-label">Artwork Views</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-number">{{ stats.total_likes }}</div>
+                <div class="stat-label">Likes</div>
+            </div>
         </div>
         <div class="styles-list">
-            <h3>Available Art Styles:</h3>
+            <h3>Artworks by Style:</h3>
             {% for style in stats.styles %}
-                <span class="style-tag">{{ style }}</span>
+                <span class="style-tag">{{ style }}<span class="style-count">{{ stats.style_counts[style] }}</span></span>
             {% endfor %}
         </div>
     </div>
@@ -730,62 +864,63 @@ def create_html_templates():
     print("HTML templates created successfully!")
 
 # Create HTML templates
-create_html_templates()
+if not RENDER_WORKER:
+    create_html_templates()
+
+# Widths served by /images/<artwork_id>/<size>, one per image pyramid level
+IMAGE_SIZES = {width: (width, height) for width, height in VirtualGalleryManager.IMAGE_PYRAMID.values()}
+IMAGE_MAX_AGE = 24 * 60 * 60
+
+def artwork_image_url(artwork_id, level='card', **kwargs):
+    """URL of the cached image endpoint for one pyramid level of an artwork"""
+    width = VirtualGalleryManager.IMAGE_PYRAMID[level][0]
+    if not has_request_context():
+        # Event listeners run on worker threads, outside any request
+        return app.url_map.bind('').build('artwork_image', {'artwork_id': artwork_id, 'size': width})
+    return url_for('artwork_image', artwork_id=artwork_id, size=width, **kwargs)
+
+def session_user_id():
+    """The session's user id, with a new profile if its own was evicted while unchanged"""
+    user_id = session.get('user_id')
+    if user_id and user_id not in gallery_manager.users:
+        gallery_manager.add_user(new_user_profile(user_id), anonymous=True)
+    return user_id
 
 @app.route('/')
 def index():
     """Main gallery page"""
     # Create a demo user if none exists in session
-    if 'user_id' not in session:
-        session['user_id'] = str(uuid.uuid4())
-        # Create a demo user profile
-        demo_user = UserProfile(
-            user_id=session['user_id'],
-            preferred_styles=["digital", "abstract"],
-            preferred_colors=["vibrant", "cool"],
-            liked_artworks=[],
-            viewing_history=[],
-            interaction_weights={"style": 0.4, "color": 0.3, "tags": 0.3}
-        )
-        gallery_manager.add_user(demo_user)
+    session.setdefault('user_id', str(uuid.uuid4()))
+    session_user_id()
     return render_template('index.html')
 
 @app.route('/api/recommendations')
 def get_recommendations():
     """Get AI recommendations for current user"""
-    user_id = session.get('user_id')
+    user_id = session_user_id()
     if not user_id:
         return jsonify({'error': 'No user session'}), 400
     count = request.args.get('count', 12, type=int)
-    recommendations = gallery_manager.get_recommendations(user_id, count)
-    # Add base64 image data for each artwork
+    offset = request.args.get('offset', 0, type=int)
+    recommendations = gallery_manager.get_recommendations(user_id, count, offset)
+    # Images are fetched separately by URL so browsers can cache them; render
+    # any pyramids the store is missing up front so those requests are all hits
+    gallery_manager.ensure_image_pyramids([gallery_manager.get_artwork(rec['id']) for rec in recommendations])
     for rec in recommendations:
-        if rec.get('image_url'):
-            img = gallery_manager.art_generator.generate_abstract_art(
-                width=400, height=300, color_scheme=rec['color_palette'][0]
-            )
-            buffer = io.BytesIO()
-            img.save(buffer, format='PNG')
-            img_str = base64.b64encode(buffer.getvalue()).decode()
-            rec['image_data'] = f'data:image/png;base64,{img_str}'
+        rec['thumbnail_url'] = artwork_image_url(rec['id'])
     return jsonify({
         'status': 'success',
         'recommendations': recommendations,
-        'total': len(recommendations)
+        'total': len(recommendations),
+        'offset': offset
     })
 
 @app.route('/api/artworks')
 def get_all_artworks():
     """Get all artworks in the gallery"""
     artworks = []
+    # Thumbnails are rendered by /images as the browser asks for them
     for artwork in gallery_manager.artworks:
-        # Generate base64 image data for each artwork
-        img = gallery_manager.art_generator.generate_abstract_art(
-            width=400, height=300, color_scheme=artwork.color_palette[0]
-        )
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
         artwork_dict = {
             'id': artwork.id,
             'title': artwork.title,
@@ -795,7 +930,7 @@ def get_all_artworks():
             'tags': artwork.tags,
             'description': artwork.description,
             'image_url': artwork.image_url,
-            'image_data': f'data:image/png;base64,{img_str}',
+            'thumbnail_url': artwork_image_url(artwork.id),
             'created_date': artwork.created_date,
             'ai_generated': artwork.ai_generated
         }
@@ -806,25 +941,136 @@ def get_all_artworks():
         'total': len(artworks)
     })
 
+@app.route('/images/<artwork_id>/<int:size>')
+def artwork_image(artwork_id, size):
+    """Serve an artwork image with ETag/Last-Modified validation and browser caching"""
+    if size not in IMAGE_SIZES:
+        abort(404)
+    artwork = gallery_manager.get_artwork(artwork_id)
+    if artwork is None:
+        abort(404)
+    width, height = IMAGE_SIZES[size]
+    fmt = image_encoder.negotiate(request.headers.get('Accept'))
+    img_bytes = gallery_manager.get_image(artwork, width, height, fmt)
+    last_modified = thumbnail_store.modified_time(gallery_manager.image_key(artwork, width, height, fmt))
+    # send_file answers If-None-Match / If-Modified-Since with 304
+    response = send_file(
+        io.BytesIO(img_bytes),
+        mimetype=image_encoder.mimetype(fmt),
+        etag=hashlib.md5(img_bytes).hexdigest(),
+        last_modified=last_modified,
+        max_age=IMAGE_MAX_AGE,
+        conditional=True
+    )
+    response.vary.add('Accept')
+    return response
+
+@app.route('/api/image-stats')
+def image_stats():
+    """Encode cost per image format and thumbnail store usage"""
+    return jsonify({
+        'status': 'success',
+        'encoding': image_encoder.stats(),
+        'store': thumbnail_store.stats()
+    })
+
+@app.route('/api/recommendation-stats')
+def recommendation_stats():
+    """Hit rates of the per-user and shared recommendation caches"""
+    shared_cache = gallery_manager.recommendation_engine.shared_cache
+    return jsonify({
+        'status': 'success',
+        'cache': gallery_manager.recommendation_cache.stats(),
+        'shared_cache': shared_cache.stats() if shared_cache is not None else None
+    })
+
+@app.route('/api/storage-stats')
+def storage_stats():
+    """User store occupancy and interaction log size and compactions"""
+    log = gallery_manager.interaction_log
+    return jsonify({
+        'status': 'success',
+        'users': gallery_manager.users.stats(),
+        'interaction_log': log.stats() if log is not None else None
+    })
+
+# Clients subscribe to /api/events instead of re-fetching the artwork list
+event_broadcaster = EventBroadcaster()
+
+def publish_gallery_event(event, payload):
+    """Forward gallery changes to connected clients"""
+    if event == 'artwork_added':
+        payload = {**payload, 'thumbnail_url': artwork_image_url(payload['id'])}
+    event_broadcaster.publish(event, payload)
+
+def publish_job_event(job):
+    """Forward generation job progress to connected clients"""
+    event_broadcaster.publish('job', {
+        'job_id': job.job_id,
+        'status': job.status,
+        'queue_depth': generation_queue.depth(),
+        'artwork_id': job.result.id if job.status == 'done' else None,
+        'error': job.error
+    })
+
+if not RENDER_WORKER:
+    gallery_manager.add_listener(publish_gallery_event)
+
+    # Generation runs on a bounded worker pool instead of inside the request; the
+    # generated image pyramid goes straight into the thumbnail store
+    generation_queue = GenerationQueue(gallery_manager.generate_ai_artwork, workers=2, max_depth=32,
+                                       on_change=publish_job_event)
+JOB_MAX_WAIT = 30
+
+@app.route('/api/events')
+def event_stream():
+    """Server-Sent Events for new artworks and generation job progress"""
+    # Browsers send Last-Event-ID when reconnecting so missed events are replayed
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(
+        event_broadcaster.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/generate-artwork', methods=['POST'])
 def generate_artwork():
-    """Generate a new AI artwork"""
+    """Queue a new AI artwork for generation"""
     try:
         data = request.get_json()
         style = data.get('style', 'vibrant')
         title = data.get('title', None)
-        # Generate the artwork
-        artwork = gallery_manager.generate_ai_artwork(style, title)
-        # Generate a placeholder image data (base64 encoded)
-        img = gallery_manager.art_generator.generate_abstract_art(
-            width=400, height=300, color_scheme=style
-        )
-        # Convert PIL image to base64 for display
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
+        job = generation_queue.submit(style_preference=style, title=title)
+        return jsonify({
+            'status': 'queued',
+            'job_id': job.job_id,
+            'status_url': url_for('generation_job', job_id=job.job_id)
+        }), 202
+    except JobQueueFull as e:
+        response = jsonify({
+            'status': 'error',
+            'message': 'Too many artworks are being generated, please try again shortly'
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>')
+def generation_job(job_id):
+    """Status of a generation job; ?wait=<seconds> long-polls until it finishes"""
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_MAX_WAIT)
+    job = generation_queue.wait(job_id, wait)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    if job.status == 'done':
+        artwork = job.result
         return jsonify({
             'status': 'success',
+            'job_id': job.job_id,
             'artwork': {
                 'id': artwork.id,
                 'title': artwork.title,
@@ -833,32 +1079,33 @@ def generate_artwork():
                 'tags': artwork.tags,
                 'description': artwork.description,
                 'ai_generated': artwork.ai_generated,
-                'image_data': f'data:image/png;base64,{img_str}'
+                'thumbnail_url': artwork_image_url(artwork.id)
             }
         })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    if job.status == 'failed':
+        return jsonify({'status': 'error', 'job_id': job.job_id, 'message': job.error})
+    return jsonify({
+        'status': job.status,
+        'job_id': job.job_id,
+        'queue_depth': generation_queue.depth()
+    })
 
 @app.route('/api/interact', methods=['POST'])
 def user_interaction():
     """Record user interaction with artwork"""
-    user_id = session.get('user_id')
+    user_id = session_user_id()
     if not user_id:
         return jsonify({'error': 'No user session'}), 400
     try:
         data = request.get_json()
         artwork_id = data.get('artwork_id')
         interaction_type = data.get('type')  # 'view', 'like', 'unlike'
+        if artwork_id not in gallery_manager.artworks:
+            return jsonify({'error': 'Artwork not found'}), 404
         if interaction_type == 'like':
             gallery_manager.update_user_interaction(user_id, artwork_id, 'like')
         elif interaction_type == 'unlike':
-            if user_id in gallery_manager.users:
-                user = gallery_manager.users[user_id]
-                if artwork_id in user.liked_artworks:
-                    user.liked_artworks.remove(artwork_id)
+            gallery_manager.update_user_interaction(user_id, artwork_id, 'unlike')
         elif interaction_type == 'view':
             gallery_manager.update_user_interaction(user_id, artwork_id, 'view')
         return jsonify({'status': 'success'})
@@ -871,8 +1118,8 @@ def user_interaction():
 @app.route('/api/user-profile')
 def get_user_profile():
     """Get current user's profile and preferences"""
-    user_id = session.get('user_id')
-    if not user_id or user_id not in gallery_manager.users:
+    user_id = session_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     user = gallery_manager.users[user_id]
     return jsonify({
@@ -890,16 +1137,16 @@ def get_user_profile():
 @app.route('/api/update-preferences', methods=['POST'])
 def update_preferences():
     """Update user preferences"""
-    user_id = session.get('user_id')
-    if not user_id or user_id not in gallery_manager.users:
+    user_id = session_user_id()
+    if not user_id:
         return jsonify({'error': 'User not found'}), 404
     try:
         data = request.get_json()
-        user = gallery_manager.users[user_id]
-        if 'preferred_styles' in data:
-            user.preferred_styles = data['preferred_styles']
-        if 'preferred_colors' in data:
-            user.preferred_colors = data['preferred_colors']
+        gallery_manager.update_user_preferences(
+            user_id,
+            preferred_styles=data.get('preferred_styles'),
+            preferred_colors=data.get('preferred_colors')
+        )
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({
@@ -910,10 +1157,16 @@ def update_preferences():
 @app.route('/export-artsteps')
 def export_artsteps():
     """Export gallery for Artsteps integration"""
-    user_id = session.get('user_id')
+    user_id = session_user_id()
     if not user_id:
         return jsonify({'error': 'No user session'}), 400
     gallery_data = gallery_manager.export_gallery_for_artsteps(user_id)
+    # Link every pyramid level so the importer can pick the size it needs
+    for artwork in gallery_data['artworks']:
+        artwork['image_urls'] = {
+            level: artwork_image_url(artwork['id'], level, _external=True)
+            for level in VirtualGalleryManager.IMAGE_PYRAMID
+        }
     # Create a temporary file for download
     buffer = io.StringIO()
     json.dump(gallery_data, buffer)
@@ -928,12 +1181,7 @@ def export_artsteps():
 @app.route('/admin')
 def admin_dashboard():
     """Simple admin dashboard to view gallery stats"""
-    stats = {
-        'total_artworks': len(gallery_manager.artworks),
-        'total_users': len(gallery_manager.users),
-        'ai_generated_count': len([a for a in gallery_manager.artworks if a.ai_generated]),
-        'styles': list(set([a.style for a in gallery_manager.artworks]))
-    }
+    stats = gallery_manager.get_stats()
     return render_template('admin.html', stats=stats)
 
 # Error handlers
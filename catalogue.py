@@ -0,0 +1,231 @@
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from storage import ArtworkSummary
+
+# Palette entries are packed as 0xRRGGBB; anything not written as "#RRGGBB"
+# is interned instead and stored as its code with this bit set
+HEX_COLOR = re.compile(r'#[0-9A-F]{6}')
+INTERNED_COLOR = 1 << 31
+
+class _Strings:
+    """Interned strings, each stored once and referred to by its code"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _Text:
+    """Strings packed end to end as UTF-8, with the offset where each one ends"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('Q')
+
+    def extend(self, values: List[str]):
+        for value in values:
+            self.data += value.encode('utf-8')
+            self.ends.append(len(self.data))
+
+    def __getitem__(self, index: int) -> str:
+        start = self.ends[index - 1] if index else 0
+        return self.data[start:self.ends[index]].decode('utf-8')
+
+class _Column:
+    """NumPy array filled from the front, doubling its capacity as it grows"""
+
+    def __init__(self, dtype):
+        self._data = np.zeros(64, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            grown = np.zeros(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    def __getitem__(self, index):
+        return self._data[:self.size][index]
+
+class ArtworkCatalogue:
+    """Artworks stored column by column instead of one object each
+
+    Styles, artists and creation dates are interned codes in NumPy arrays,
+    tags are interned ids in CSR form (a flat id array plus per-artwork end
+    offsets), palettes are packed 0xRRGGBB values laid out the same way, and
+    titles, descriptions and image URLs are packed UTF-8. Reading an entry
+    builds a fresh artwork_type instance from the columns, so nothing larger
+    than the columns themselves is kept per artwork.
+
+    Implements the same interface as ArtworkRegistry, and feature_columns()
+    hands the scoring columns to ArtworkFeatures in bulk.
+    """
+
+    def __init__(self, artwork_type: Any, artworks: Optional[List[Any]] = None):
+        self.artwork_type = artwork_type
+        self.style_names = _Strings()
+        self.tag_names = _Strings()
+        self._values = _Strings()  # artists, dates and non-hex colors
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}  # id -> row
+        self._styles = _Column(np.int32)
+        self._artists = _Column(np.int32)
+        self._created = _Column(np.int32)
+        self._ai_generated = _Column(np.bool_)
+        self._tag_ends = _Column(np.int64)
+        self._tag_ids = _Column(np.int32)
+        self._palette_ends = _Column(np.int64)
+        self._palette = _Column(np.uint32)
+        self._titles = _Text()
+        self._descriptions = _Text()
+        self._image_urls = _Text()
+        self.style_counts: Counter = Counter()
+        self.ai_count = 0
+        self._lock = threading.Lock()
+        self.extend(artworks or [])
+
+    def _pack_color(self, color: str) -> int:
+        if HEX_COLOR.fullmatch(color):
+            return int(color[1:], 16)
+        return INTERNED_COLOR | self._values.code(color)
+
+    def _unpack_color(self, value: int) -> str:
+        if value & INTERNED_COLOR:
+            return self._values.values[value & ~INTERNED_COLOR]
+        return f"#{value:06X}"
+
+    def add(self, artwork):
+        """Append an artwork, raising ValueError if its id is already registered"""
+        self.extend([artwork])
+
+    def extend(self, artworks: List[Any]):
+        """Append artworks, filling each column once for the whole batch"""
+        # Lazy entries are read in full, since the columns hold every field
+        artworks = [artwork.hydrate() if hasattr(artwork, "hydrate") else artwork for artwork in artworks]
+        with self._lock:
+            seen = set()
+            for artwork in artworks:
+                if artwork.id in self._rows or artwork.id in seen:
+                    raise ValueError(f"Duplicate artwork id: {artwork.id}")
+                seen.add(artwork.id)
+
+            tag_ids, palette = [], []
+            tag_ends, palette_ends = [], []
+            tag_end = int(self._tag_ends[-1]) if self._tag_ends.size else 0
+            palette_end = int(self._palette_ends[-1]) if self._palette_ends.size else 0
+            for artwork in artworks:
+                tag_ids.extend(self.tag_names.code(tag) for tag in artwork.tags)
+                tag_end += len(artwork.tags)
+                tag_ends.append(tag_end)
+                palette.extend(self._pack_color(color) for color in artwork.color_palette)
+                palette_end += len(artwork.color_palette)
+                palette_ends.append(palette_end)
+
+            self._styles.extend([self.style_names.code(artwork.style) for artwork in artworks])
+            self._artists.extend([self._values.code(artwork.artist) for artwork in artworks])
+            self._created.extend([self._values.code(artwork.created_date) for artwork in artworks])
+            self._ai_generated.extend([bool(artwork.ai_generated) for artwork in artworks])
+            self._tag_ids.extend(tag_ids)
+            self._tag_ends.extend(tag_ends)
+            self._palette.extend(palette)
+            self._palette_ends.extend(palette_ends)
+            self._titles.extend([artwork.title for artwork in artworks])
+            self._descriptions.extend([artwork.description for artwork in artworks])
+            self._image_urls.extend([artwork.image_url for artwork in artworks])
+            for artwork in artworks:
+                self._rows[artwork.id] = len(self._ids)
+                self._ids.append(artwork.id)
+                self.style_counts[artwork.style] += 1
+                if artwork.ai_generated:
+                    self.ai_count += 1
+
+    def _span(self, ends: _Column, index: int) -> Tuple[int, int]:
+        return (int(ends[index - 1]) if index else 0), int(ends[index])
+
+    def _tags(self, index: int) -> List[str]:
+        start, end = self._span(self._tag_ends, index)
+        names = self.tag_names.values
+        return [names[code] for code in self._tag_ids[start:end].tolist()]
+
+    def _artwork(self, index: int):
+        start, end = self._span(self._palette_ends, index)
+        values = self._values.values
+        return self.artwork_type(
+            id=self._ids[index],
+            title=self._titles[index],
+            artist=values[self._artists[index]],
+            style=self.style_names.values[self._styles[index]],
+            color_palette=[self._unpack_color(value) for value in self._palette[start:end].tolist()],
+            tags=self._tags(index),
+            description=self._descriptions[index],
+            image_url=self._image_urls[index],
+            created_date=values[self._created[index]],
+            ai_generated=bool(self._ai_generated[index])
+        )
+
+    def get(self, artwork_id: str):
+        index = self._rows.get(artwork_id)
+        return self._artwork(index) if index is not None else None
+
+    def summaries(self, start: int = 0) -> Iterator[ArtworkSummary]:
+        """The id, style, tags and ai flag of each artwork from a position on, without building it"""
+        names = self.style_names.values
+        for index in range(start, len(self)):
+            yield ArtworkSummary(self._ids[index], names[self._styles[index]],
+                                 self._tags(index), bool(self._ai_generated[index]))
+
+    def feature_columns(self, start: int = 0) -> Tuple:
+        """Scoring columns for the rows from start on
+
+        Returns the ids, the style code of each row with the style names the
+        codes refer to, and the tag ids of those rows in CSR form with their
+        row offsets relative to start and the tag names.
+        """
+        with self._lock:
+            stop = len(self._ids)
+            tag_start = int(self._tag_ends[start - 1]) if start else 0
+            tag_stop = int(self._tag_ends[stop - 1]) if stop else 0
+            return (
+                self._ids[start:stop],
+                self._styles[start:stop].copy(),
+                list(self.style_names.values),
+                self._tag_ids[tag_start:tag_stop].copy(),
+                self._tag_ends[start:stop] - tag_start,
+                list(self.tag_names.values)
+            )
+
+    def snapshot(self) -> Iterator:
+        """Every artwork in order, built one at a time"""
+        for index in range(len(self)):
+            yield self._artwork(index)
+
+    def styles(self) -> List[str]:
+        """Styles present in the gallery, in order of first appearance"""
+        return list(self.style_counts)
+
+    def __contains__(self, artwork_id: str) -> bool:
+        return artwork_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return self.snapshot()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._artwork(i) for i in range(*index.indices(len(self)))]
+        return self._artwork(range(len(self))[int(index)])
@@ -0,0 +1,72 @@
+import json
+import queue
+import threading
+from collections import deque
+from typing import Any, Iterator, List, Optional
+
+class _Client:
+    def __init__(self, buffer: int):
+        self.messages: "queue.Queue[str]" = queue.Queue(maxsize=buffer)
+        self.dropped = False
+
+class EventBroadcaster:
+    """Fans server-sent events out to every connected client"""
+
+    def __init__(self, history: int = 100, client_buffer: int = 256, keepalive: float = 15.0):
+        self.client_buffer = client_buffer
+        self.keepalive = keepalive
+        self._clients: List[_Client] = []
+        self._history = deque(maxlen=history)  # (event id, formatted message) for reconnects
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Any):
+        """Send an event to every client; clients too slow to keep up are disconnected"""
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            message = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            self._history.append((event_id, message))
+            for client in list(self._clients):
+                try:
+                    client.messages.put_nowait(message)
+                except queue.Full:
+                    # The browser reconnects and replays from its Last-Event-ID
+                    client.dropped = True
+                    self._clients.remove(client)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> _Client:
+        """Register a client, replaying any events it missed since last_event_id"""
+        client = _Client(self.client_buffer)
+        with self._lock:
+            if last_event_id is not None:
+                for event_id, message in self._history:
+                    if event_id > last_event_id and not client.messages.full():
+                        client.messages.put_nowait(message)
+            self._clients.append(client)
+        return client
+
+    def unsubscribe(self, client: _Client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def stream(self, last_event_id: Optional[int] = None) -> Iterator[str]:
+        """Yield SSE-formatted messages for one client until it disconnects"""
+        client = self.subscribe(last_event_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield client.messages.get(timeout=self.keepalive)
+                except queue.Empty:
+                    if client.dropped:
+                        return
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def client_count(self) -> int:
+        with self._lock:
+            return len(self._clients)
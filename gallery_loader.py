@@ -0,0 +1,145 @@
+import re
+import json
+import threading
+from typing import Any, Dict, Iterator, Tuple
+
+class GalleryDataFile:
+    """Streaming reader for gallery_data.json
+
+    Walks the file a chunk at a time, decoding one artwork or user at a time,
+    so memory use does not grow with the size of the file. Each artwork comes
+    with its byte offset and length, which read_record() uses to decode it
+    again later without rescanning.
+    """
+
+    def __init__(self, filename: str, chunk_size: int = 1 << 20):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._handle = None
+        self._lock = threading.Lock()
+
+    def iter_records(self) -> Iterator[Tuple[str, Any, Dict]]:
+        """Yield ("artwork", (offset, length), data) and ("user", user_id, data) in file order"""
+        with self._lock:
+            # Held open so records stay readable if the file is later replaced
+            if self._handle is None:
+                self._handle = open(self.filename, 'rb')
+        with open(self.filename, encoding='utf-8', newline='') as f:
+            scanner = _Scanner(f, self.chunk_size, self._decoder)
+            scanner.expect('{')
+            while not scanner.at('}'):
+                key = scanner.value()
+                scanner.expect(':')
+                if key == 'artworks':
+                    scanner.expect('[')
+                    while not scanner.at(']'):
+                        start = scanner.byte_offset()
+                        data = scanner.value()
+                        yield "artwork", (start, scanner.byte_offset() - start), data
+                        scanner.separator(']')
+                    scanner.expect(']')
+                elif key == 'users':
+                    scanner.expect('{')
+                    while not scanner.at('}'):
+                        user_id = scanner.value()
+                        scanner.expect(':')
+                        data = scanner.value()
+                        yield "user", user_id, data
+                        scanner.separator('}')
+                    scanner.expect('}')
+                else:
+                    scanner.value()
+                scanner.separator('}')
+
+    def read_record(self, offset: int, length: int) -> Dict:
+        """Decode the record stored at a byte range reported by iter_records()"""
+        with self._lock:
+            if self._handle is None:
+                self._handle = open(self.filename, 'rb')
+            self._handle.seek(offset)
+            raw = self._handle.read(length)
+        return json.loads(raw)
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+class _Scanner:
+    """Cursor over a text file that is read into a buffer on demand"""
+
+    WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+    def __init__(self, f, chunk_size: int, decoder: json.JSONDecoder):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = decoder
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # Byte offset of buffer[mark]; advanced lazily so each character is
+        # measured once even when the file is not plain ASCII
+        self.mark = 0
+        self.mark_bytes = 0
+        self.ascii = True
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > self.chunk_size:
+            # Drop what has been consumed so the buffer stays around one chunk
+            self.byte_offset()
+            self.buffer = self.buffer[self.pos:]
+            self.mark -= self.pos
+            self.pos = 0
+        self.ascii = self.ascii and chunk.isascii()
+        self.buffer += chunk
+        return True
+
+    def _skip(self):
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def byte_offset(self) -> int:
+        segment = self.buffer[self.mark:self.pos]
+        self.mark_bytes += len(segment) if self.ascii else len(segment.encode('utf-8'))
+        self.mark = self.pos
+        return self.mark_bytes
+
+    def at(self, char: str) -> bool:
+        self._skip()
+        return self.buffer.startswith(char, self.pos)
+
+    def expect(self, char: str):
+        self._skip()
+        if not self.buffer.startswith(char, self.pos):
+            raise ValueError(f"Expected {char!r} at character {self.pos} of the buffered gallery data")
+        self.pos += 1
+
+    def separator(self, closing: str):
+        """Consume the comma between items, if the container does not end here"""
+        if not self.at(closing):
+            self.expect(',')
+
+    def value(self) -> Any:
+        self._skip()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number could continue past the end of the buffer
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
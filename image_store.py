@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class ThumbnailStore:
+    """Content-addressed on-disk store for encoded artwork images with LRU eviction"""
+
+    def __init__(self, directory: str = "image_cache", max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # filename -> size, oldest first
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the LRU order from files left by previous runs"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            if name.endswith('.tmp'):
+                # Interrupted write from a previous run
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_atime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def make_key(artwork_id: str, width: int, height: int, fmt: str = "png", **params) -> str:
+        """Build the file name for an artwork rendered at a size with the given parameters"""
+        payload = json.dumps({
+            "artwork_id": artwork_id,
+            "size": [width, height],
+            "format": fmt,
+            "params": params
+        }, sort_keys=True)
+        return f"{hashlib.sha256(payload.encode()).hexdigest()}.{fmt}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored bytes for a key, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+        # Read without the lock so concurrent requests do not wait on each
+        # other's disk reads; put() replaces files whole, so none is seen torn
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                # Evicted in the meantime, or removed from outside the store
+                if key in self._entries and not os.path.exists(path):
+                    self.total_bytes -= self._entries.pop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        # Persist recency in the access time so the LRU order survives restarts;
+        # the modification time keeps recording when the image was rendered
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Write encoded bytes for a key and evict old entries beyond the size budget"""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def modified_time(self, key: str) -> Optional[float]:
+        """Return when the stored bytes for a key were written, or None if absent"""
+        try:
+            return os.path.getmtime(self._path(key))
+        except OSError:
+            return None
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Return entry count, size and hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
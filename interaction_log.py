@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+def fsync_directory(path: str):
+    """Make a rename or removal of a file in the directory holding path durable"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        # Directories cannot be opened for syncing on some platforms, such as Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class InteractionLog:
+    """Append-only JSONL log of gallery changes, folded into a snapshot as it grows
+
+    Every record is one line. Once the log passes compact_bytes it is moved
+    aside and a background thread calls the compaction callback, which should
+    write a full snapshot; the moved-aside log is deleted only after that
+    succeeds. Replaying the records must be idempotent, since a snapshot may
+    already include changes that are still in the log.
+
+    fsync is "always" (after every record), "interval" (at most once per
+    fsync_interval seconds, with a timer syncing the tail of a burst, so at
+    most that much is lost on power failure) or "never" (leave it to the OS).
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(self, path: str = "gallery_data.log", fsync: str = "interval",
+                 fsync_interval: float = 1.0, compact_bytes: int = 4 * 1024 * 1024):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(self.FSYNC_POLICIES)}")
+        self.path = path
+        self.compacting_path = f"{path}.compacting"
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_bytes = compact_bytes
+        self.appends = 0
+        self.compactions = 0
+        self.failed_compactions = 0
+        self._file = None
+        self._size = 0
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self._sync_timer: Optional[threading.Timer] = None
+        self._compact: Optional[Callable[[], None]] = None
+        self._compacting = False
+        self._intact_sizes: Dict[str, int] = {}  # path -> end of its last complete line
+        self._lock = threading.Lock()
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield logged records in order, including any left by an unfinished compaction
+
+        A line that does not decode is skipped. A final line without a newline
+        is a write torn by a crash; it is dropped, and open() cuts it off so
+        the next record does not land on the end of it.
+        """
+        for path in (self.compacting_path, self.path):
+            if not os.path.exists(path):
+                continue
+            intact = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        logger.warning("Dropping torn record at byte %d of %s", intact, path)
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping undecodable record at byte %d of %s", intact, path)
+                        record = None
+                    intact += len(line)
+                    if record is not None:
+                        yield record
+            self._intact_sizes[path] = intact
+
+    def open(self, compact: Callable[[], None]):
+        """Start appending; compact is called from a background thread to write a snapshot"""
+        with self._lock:
+            for path, intact in self._intact_sizes.items():
+                if os.path.exists(path) and os.path.getsize(path) > intact:
+                    os.truncate(path, intact)
+            self._intact_sizes.clear()
+            self._compact = compact
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._size = self._file.tell()
+
+    def append(self, record: Dict):
+        """Write one record, syncing to disk according to the fsync policy"""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line.encode('utf-8'))
+            self.appends += 1
+            now = time.time()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+                self._unsynced = False
+            elif self.fsync == "interval":
+                self._unsynced = True
+                if self._sync_timer is None:
+                    # Sync the record even if nothing else is appended after it
+                    self._sync_timer = threading.Timer(self._last_fsync + self.fsync_interval - now,
+                                                       self._sync_unsynced)
+                    self._sync_timer.daemon = True
+                    self._sync_timer.start()
+            if self._size >= self.compact_bytes and not self._compacting and self._compact is not None:
+                self._rotate()
+                self._compacting = True
+                threading.Thread(target=self._run_compaction, name="log-compaction", daemon=True).start()
+
+    def _sync_unsynced(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._file is not None and self._unsynced:
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.time()
+                self._unsynced = False
+
+    def _rotate(self):
+        # Move the current log aside, appending to what a failed compaction left behind
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+        self._file.close()
+        if os.path.exists(self.compacting_path):
+            with open(self.path, 'rb') as src, open(self.compacting_path, 'ab') as dst:
+                dst.write(src.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.compacting_path)
+        fsync_directory(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+
+    def _run_compaction(self):
+        try:
+            # The callback syncs the snapshot to disk before this removes the
+            # only other copy of the changes it holds
+            self._compact()
+            os.remove(self.compacting_path)
+            fsync_directory(self.compacting_path)
+            with self._lock:
+                self.compactions += 1
+        except Exception:
+            # The moved-aside log is kept and replayed, so nothing is lost
+            with self._lock:
+                self.failed_compactions += 1
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def close(self):
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "bytes": self._size,
+                "compact_bytes": self.compact_bytes,
+                "appends": self.appends,
+                "compactions": self.compactions,
+                "failed_compactions": self.failed_compactions
+            }
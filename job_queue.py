@@ -0,0 +1,116 @@
+import math
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted to a queue that is already at its maximum depth"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+@dataclass
+class Job:
+    job_id: str
+    params: Dict[str, Any]
+    status: str = "queued"  # queued, running, done, failed
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+class GenerationQueue:
+    """Bounded job queue processed by a fixed pool of worker threads"""
+
+    def __init__(self, handler: Callable[..., Any], workers: int = 2, max_depth: int = 32,
+                 max_finished: int = 1000, on_change: Optional[Callable[[Job], None]] = None):
+        self.handler = handler
+        self.on_change = on_change
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_finished = max_finished
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max_depth)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._avg_seconds = 1.0  # running average of job duration, seeds Retry-After
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"generation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, **params) -> Job:
+        """Queue a job for the handler, raising JobQueueFull when the queue is at max depth"""
+        job = Job(job_id=uuid.uuid4().hex, params=params)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(self.retry_after())
+            self._jobs[job.job_id] = job
+            # Announced before releasing the lock, which a worker takes to
+            # mark the job running, so "queued" always goes out first
+            self._changed(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Return a job once it has finished or the timeout expires, whichever comes first"""
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a queue slot frees up"""
+        return max(1, math.ceil(self._avg_seconds * max(self.depth(), 1) / self.workers))
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                job.status = "running"
+            self._changed(job)
+            started = time.time()
+            try:
+                job.result = self.handler(**job.params)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+            with self._lock:
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (job.finished_at - started)
+                self._forget_finished()
+            job.done.set()
+            self._changed(job)
+            self._queue.task_done()
+
+    def _changed(self, job: Job):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception:
+                # A broken listener must not take a worker down with it
+                logger.exception("Generation job listener failed on %s job %s", job.status, job.job_id)
+
+    def _forget_finished(self):
+        # Keep only the most recent finished jobs; pending ones are never dropped
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
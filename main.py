@@ -1,12 +1,31 @@
+import io
+import os
 import json
 import random
+import time
+import logging
+import threading
+import multiprocessing
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Callable, Union
 from dataclasses import dataclass, asdict
 from datetime import datetime
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import hashlib
+import heapq
 from PIL import Image, ImageDraw, ImageFilter
 import colorsys
+from image_store import ThumbnailStore
+from user_store import UserStore
+from gallery_loader import GalleryDataFile
+from snapshot import SnapshotFile, is_snapshot, write_snapshot
+from interaction_log import InteractionLog, fsync_directory
+from storage import SQLiteStorage
+from catalogue import ArtworkCatalogue
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class Artwork:
@@ -21,6 +40,79 @@ class Artwork:
     created_date: str
     ai_generated: bool = False
 
+class IndexedList(list):
+    """List that keeps a count of its items so membership tests are O(1)"""
+    
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._counts = Counter(self)
+    
+    def __contains__(self, item) -> bool:
+        return item in self._counts
+    
+    def __reduce__(self):
+        return (type(self), (list(self),))
+    
+    def _added(self, items):
+        self._counts.update(items)
+    
+    def _removed(self, items):
+        self._counts.subtract(items)
+        for item in set(items):
+            if self._counts[item] <= 0:
+                del self._counts[item]
+    
+    def append(self, item):
+        super().append(item)
+        self._added([item])
+    
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self._added(items)
+    
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+    
+    def __imul__(self, n: int):
+        super().__imul__(n)
+        self._counts = Counter(self)
+        return self
+    
+    def insert(self, index: int, item):
+        super().insert(index, item)
+        self._added([item])
+    
+    def remove(self, item):
+        super().remove(item)
+        self._removed([item])
+    
+    def pop(self, index: int = -1):
+        item = super().pop(index)
+        self._removed([item])
+        return item
+    
+    def clear(self):
+        super().clear()
+        self._counts.clear()
+    
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            super().__setitem__(index, value)
+            # A slice assignment can change the length, so just recount
+            self._counts = Counter(self)
+        else:
+            old = self[index]
+            super().__setitem__(index, value)
+            self._removed([old])
+            self._added([value])
+    
+    def __delitem__(self, index):
+        old = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._removed(old)
+
 @dataclass
 class UserProfile:
     user_id: str
@@ -29,26 +121,113 @@ class UserProfile:
     liked_artworks: List[str]
     viewing_history: List[str]
     interaction_weights: Dict[str, float]
+    
+    # Membership in these is tested per artwork while scoring
+    _INDEXED_FIELDS = ("liked_artworks", "viewing_history")
+    
+    def __setattr__(self, name, value):
+        if name in self._INDEXED_FIELDS and not isinstance(value, IndexedList):
+            value = IndexedList(value)
+        super().__setattr__(name, value)
 
 class AIArtGenerator:
     """Simple AI art generator using procedural techniques"""
     
+    # Define color schemes
+    COLOR_SCHEMES = {
+        "vibrant": [(255, 59, 48), (255, 149, 0), (255, 204, 0), (52, 199, 89), (0, 122, 255)],
+        "pastel": [(255, 214, 214), (255, 238, 214), (214, 255, 235), (214, 235, 255), (235, 214, 255)],
+        "monochrome": [(0, 0, 0), (64, 64, 64), (128, 128, 128), (192, 192, 192), (255, 255, 255)],
+        "earth": [(139, 69, 19), (160, 82, 45), (210, 180, 140), (222, 184, 135), (245, 245, 220)]
+    }
+    
+    BACKENDS = ("numpy", "pil")
+    
+    # Shared process pool for render_pyramids, created on first use
+    _pool: Optional[ProcessPoolExecutor] = None
+    _pool_lock = threading.Lock()
+    
+    @staticmethod
+    def palette_for(color_scheme: str) -> List[str]:
+        """Hex color palette recorded on artworks rendered with a color scheme"""
+        colors = AIArtGenerator.COLOR_SCHEMES.get(color_scheme, AIArtGenerator.COLOR_SCHEMES["vibrant"])
+        return [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in colors[:3]]
+    
+    @staticmethod
+    def color_scheme_for(color_palette: List[str]) -> str:
+        """Recover the color scheme an artwork palette came from, defaulting to vibrant"""
+        for name in AIArtGenerator.COLOR_SCHEMES:
+            if [c.upper() for c in color_palette] == AIArtGenerator.palette_for(name):
+                return name
+        return "vibrant"
+    
+    @staticmethod
+    def encode(image: Image.Image, fmt: str = "PNG", **options) -> bytes:
+        """Encode an image to bytes, passing options such as quality to PIL"""
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **options)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def seed_for(artwork_id: str) -> int:
+        """Derive a stable rendering seed from an artwork id"""
+        return int(hashlib.sha256(artwork_id.encode()).hexdigest()[:16], 16)
+    
     @staticmethod
     def generate_abstract_art(width: int = 800, height: int = 600, 
-                            color_scheme: str = "vibrant") -> Image.Image:
-        """Generate abstract art using geometric shapes and gradients"""
-        image = Image.new('RGB', (width, height), 'white')
-        draw = ImageDraw.Draw(image)
+                            color_scheme: str = "vibrant",
+                            backend: str = "numpy",
+                            seed: Optional[int] = None) -> Image.Image:
+        """Generate abstract art using geometric shapes and gradients
         
-        # Define color schemes
-        color_schemes = {
-            "vibrant": [(255, 59, 48), (255, 149, 0), (255, 204, 0), (52, 199, 89), (0, 122, 255)],
-            "pastel": [(255, 214, 214), (255, 238, 214), (214, 255, 235), (214, 235, 255), (235, 214, 255)],
-            "monochrome": [(0, 0, 0), (64, 64, 64), (128, 128, 128), (192, 192, 192), (255, 255, 255)],
-            "earth": [(139, 69, 19), (160, 82, 45), (210, 180, 140), (222, 184, 135), (245, 245, 220)]
-        }
+        The "numpy" backend builds the gradient and rasterizes the shapes as
+        array operations; "pil" draws them with ImageDraw one call at a time.
+        The same seed always yields the same image; each call uses its own
+        random.Random instance, so concurrent renders do not share state.
+        """
+        if backend not in AIArtGenerator.BACKENDS:
+            raise ValueError(f"Unknown rendering backend: {backend} "
+                             f"(expected one of {', '.join(AIArtGenerator.BACKENDS)})")
+        rng = random.Random(seed)
+        colors = AIArtGenerator.COLOR_SCHEMES.get(color_scheme, AIArtGenerator.COLOR_SCHEMES["vibrant"])
+        shapes = AIArtGenerator._random_shapes(width, height, colors, rng)
+        
+        if backend == "numpy":
+            image = AIArtGenerator._render_numpy(width, height, shapes)
+        else:
+            image = AIArtGenerator._render_pil(width, height, shapes)
         
-        colors = color_schemes.get(color_scheme, color_schemes["vibrant"])
+        # Apply blur effect
+        image = image.filter(ImageFilter.GaussianBlur(radius=1))
+        return image
+    
+    @staticmethod
+    def _random_shapes(width: int, height: int, 
+                       colors: List[Tuple[int, int, int]],
+                       rng: random.Random) -> List[Tuple]:
+        """Pick the geometric shapes to draw as (type, bbox, rgba) tuples"""
+        shapes = []
+        for _ in range(rng.randint(5, 15)):
+            shape_type = rng.choice(['circle', 'rectangle', 'polygon'])
+            color = rng.choice(colors)
+            
+            if shape_type == 'circle':
+                x1, y1 = rng.randint(0, width), rng.randint(0, height)
+                radius = rng.randint(20, 100)
+                shapes.append(('circle', (x1-radius, y1-radius, x1+radius, y1+radius),
+                               (*color, rng.randint(100, 200))))
+            elif shape_type == 'rectangle':
+                x1, y1 = rng.randint(0, width//2), rng.randint(0, height//2)
+                x2, y2 = x1 + rng.randint(50, 200), y1 + rng.randint(50, 200)
+                shapes.append(('rectangle', (x1, y1, x2, y2),
+                               (*color, rng.randint(100, 200))))
+        return shapes
+    
+    @staticmethod
+    def _render_pil(width: int, height: int, shapes: List[Tuple]) -> Image.Image:
+        """Draw the gradient and shapes with ImageDraw"""
+        image = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(image)
         
         # Create background gradient
         for y in range(height):
@@ -58,31 +237,389 @@ class AIArtGenerator:
             draw.line([(0, y), (width, y)], fill=(r, g, b))
         
         # Add geometric shapes
-        for _ in range(random.randint(5, 15)):
-            shape_type = random.choice(['circle', 'rectangle', 'polygon'])
-            color = random.choice(colors)
-            
+        for shape_type, bbox, color in shapes:
             if shape_type == 'circle':
-                x1, y1 = random.randint(0, width), random.randint(0, height)
-                radius = random.randint(20, 100)
-                draw.ellipse([x1-radius, y1-radius, x1+radius, y1+radius], 
-                           fill=(*color, random.randint(100, 200)))
+                draw.ellipse(list(bbox), fill=color)
             elif shape_type == 'rectangle':
-                x1, y1 = random.randint(0, width//2), random.randint(0, height//2)
-                x2, y2 = x1 + random.randint(50, 200), y1 + random.randint(50, 200)
-                draw.rectangle([x1, y1, x2, y2], 
-                             fill=(*color, random.randint(100, 200)))
-        
-        # Apply blur effect
-        image = image.filter(ImageFilter.GaussianBlur(radius=1))
+                draw.rectangle(list(bbox), fill=color)
         return image
+    
+    @staticmethod
+    def _render_numpy(width: int, height: int, shapes: List[Tuple]) -> Image.Image:
+        """Build the gradient and rasterize the shapes as array operations"""
+        pixels = np.empty((height, width, 3), dtype=np.uint8)
+        
+        # Create background gradient
+        t = np.arange(height, dtype=np.float64) / height
+        pixels[:, :, 0] = (255 * t).astype(np.uint8)[:, None]
+        pixels[:, :, 1] = (200 * (1 - t)).astype(np.uint8)[:, None]
+        pixels[:, :, 2] = 150
+        
+        # Add geometric shapes, touching only each shape's clipped bounding box;
+        # like ImageDraw on an RGB image, the alpha component is ignored
+        for shape_type, (x1, y1, x2, y2), fill in shapes:
+            color = fill[:3]
+            left, top = max(x1, 0), max(y1, 0)
+            right, bottom = min(x2 + 1, width), min(y2 + 1, height)
+            if left >= right or top >= bottom:
+                continue
+            region = pixels[top:bottom, left:right]
+            if shape_type == 'circle':
+                cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+                radius = (x2 - x1) / 2
+                ys = np.arange(top, bottom)[:, None] - cy
+                xs = np.arange(left, right)[None, :] - cx
+                region[xs * xs + ys * ys <= radius * radius] = color
+            elif shape_type == 'rectangle':
+                region[:] = color
+        return Image.fromarray(pixels)
+    
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Forking a process that already runs queue and event threads can
+                # deadlock on locks they held; start workers from a clean process
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                cls._pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context(method))
+            return cls._pool
+    
+    @classmethod
+    def render_pyramids(cls, specs: List[Dict], sizes: List[Tuple[int, int]],
+                        encode_options: Optional[Dict] = None) -> List[List[Tuple[bytes, float]]]:
+        """Render a batch of image pyramids across a process pool
+        
+        Each spec holds generate_abstract_art keyword arguments such as
+        color_scheme and seed; it is rendered once at sizes[0] and successively
+        downsampled through the remaining sizes. encode_options are PIL save
+        arguments (PNG by default). Levels are returned per spec in input order as
+        (encoded bytes, encode seconds) pairs.
+        """
+        options = encode_options or {"format": "PNG"}
+        return cls._map_jobs(_render_pyramid_encoded, [(list(sizes), spec, options) for spec in specs])
+    
+    @classmethod
+    def _map_jobs(cls, fn, jobs: List) -> List:
+        if len(jobs) <= 1:
+            # Not worth the inter-process round trip
+            return [fn(job) for job in jobs]
+        
+        pool = cls._get_pool()
+        chunksize = max(1, len(jobs) // (4 * (os.cpu_count() or 1)))
+        try:
+            return list(pool.map(fn, jobs, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A worker died; drop the pool so the next batch starts a fresh one
+            with cls._pool_lock:
+                if cls._pool is pool:
+                    cls._pool = None
+            return [fn(job) for job in jobs]
+    
+    @staticmethod
+    def build_pyramid(image: Image.Image, sizes: List[Tuple[int, int]]) -> List[Image.Image]:
+        """Downsample an image through each size in turn, each level from the one before"""
+        levels = []
+        current = image
+        for size in sizes:
+            if current.size != tuple(size):
+                current = current.resize(tuple(size), Image.LANCZOS)
+            levels.append(current)
+        return levels
+
+def _render_pyramid_encoded(job: Tuple[List[Tuple[int, int]], Dict, Dict]) -> List[Tuple[bytes, float]]:
+    """Render and encode one image pyramid; module level so pool workers can unpickle it"""
+    sizes, spec, options = job
+    width, height = sizes[0]
+    image = AIArtGenerator.generate_abstract_art(width=width, height=height, **spec)
+    return [_encode_timed(level, options) for level in AIArtGenerator.build_pyramid(image, sizes)]
+
+def _encode_timed(image: Image.Image, options: Dict) -> Tuple[bytes, float]:
+    options = dict(options)
+    fmt = options.pop("format")
+    start = time.perf_counter()
+    data = AIArtGenerator.encode(image, fmt, **options)
+    return data, time.perf_counter() - start
+
+class ImageEncoder:
+    """Encodes rendered images as WebP, JPEG or PNG and records per-format cost"""
+    
+    # Format name -> (PIL format, MIME type)
+    FORMATS = {
+        "webp": ("WEBP", "image/webp"),
+        "jpeg": ("JPEG", "image/jpeg"),
+        "png": ("PNG", "image/png")
+    }
+    
+    def __init__(self, preference: Tuple[str, ...] = ("webp", "jpeg", "png"),
+                 quality: Optional[Dict[str, int]] = None):
+        unknown = [fmt for fmt in preference if fmt not in self.FORMATS]
+        if unknown:
+            raise ValueError(f"Unknown image formats: {unknown}")
+        self.preference = list(preference)
+        self.quality = {"webp": 80, "jpeg": 85, **(quality or {})}
+        self._stats = {fmt: {"count": 0, "seconds": 0.0, "bytes": 0} for fmt in self.FORMATS}
+        self._lock = threading.Lock()
+    
+    @property
+    def default_format(self) -> str:
+        return self.preference[0]
+    
+    def mimetype(self, fmt: str) -> str:
+        return self.FORMATS[fmt][1]
+    
+    def options(self, fmt: str) -> Dict:
+        """PIL save arguments for a format"""
+        options = {"format": self.FORMATS[fmt][0]}
+        if fmt in self.quality:
+            options["quality"] = self.quality[fmt]
+        return options
+    
+    def negotiate(self, accept: Optional[str]) -> str:
+        """Pick the most preferred format allowed by an Accept header
+        
+        WebP is only chosen when the client lists it explicitly, since many
+        clients send wildcards without being able to decode it.
+        """
+        accepted = {}
+        for part in (accept or "*/*").split(","):
+            fields = part.strip().split(";")
+            mimetype = fields[0].strip().lower()
+            q = 1.0
+            for param in fields[1:]:
+                name, _, value = param.strip().partition("=")
+                if name.strip() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            if mimetype:
+                accepted[mimetype] = q
+        
+        best, best_q = None, 0.0
+        for fmt in self.preference:
+            q = accepted.get(self.mimetype(fmt))
+            if q is None and fmt != "webp":
+                q = accepted.get("image/*", accepted.get("*/*"))
+            if q is not None and q > best_q:
+                best, best_q = fmt, q
+        return best or "png"
+    
+    def encode(self, image: Image.Image, fmt: str) -> bytes:
+        """Encode an image in a format and record the cost"""
+        data, seconds = _encode_timed(image, self.options(fmt))
+        self.record(fmt, seconds, len(data))
+        return data
+    
+    def record(self, fmt: str, seconds: float, size: int):
+        """Record one encode, including ones done in render pool workers"""
+        with self._lock:
+            stats = self._stats[fmt]
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["bytes"] += size
+    
+    def stats(self) -> Dict[str, Dict]:
+        """Return encode counts, average encode time and average output size per format"""
+        with self._lock:
+            return {
+                fmt: {
+                    "count": s["count"],
+                    "avg_encode_ms": 1000 * s["seconds"] / s["count"] if s["count"] else 0.0,
+                    "avg_bytes": s["bytes"] / s["count"] if s["count"] else 0.0,
+                    "total_bytes": s["bytes"]
+                }
+                for fmt, s in self._stats.items()
+            }
+
+def iter_summaries(artworks, start: int = 0):
+    """Artworks from a position on, as summaries when the collection provides them
+    
+    Registries and storage backends hand out summaries carrying the id, style,
+    tags and ai flag without hydrating or reading the full artwork.
+    """
+    if hasattr(artworks, "summaries"):
+        return artworks.summaries(start)
+    return (artworks[i] for i in range(start, len(artworks)))
+
+class ArtworkFeatures:
+    """Artwork styles and tags held in NumPy arrays for vectorized scoring
+    
+    Rows follow the order of the indexed artwork sequence, which is treated as
+    append-only: sync() indexes whatever was appended since the last call and
+    rebuilds only if a different or shorter sequence is passed.
+    """
+    
+    def __init__(self, style_names: List[str]):
+        self.style_names = list(style_names)
+        self.style_codes = {name: code for code, name in enumerate(self.style_names)}
+        self.tag_codes: Dict[str, int] = {}
+        self.rows: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.size = 0
+        self.nnz = 0
+        self._styles = np.zeros(64, dtype=np.int32)
+        self._tag_counts = np.zeros(64, dtype=np.int32)
+        # Artwork/tag incidence in coordinate form, one entry per distinct tag
+        self._tag_rows = np.zeros(256, dtype=np.int32)
+        self._tag_cols = np.zeros(256, dtype=np.int32)
+        self._source = None
+        self._source_tags = np.zeros(0, dtype=np.int32)  # source tag id -> tag code
+    
+    @staticmethod
+    def _grow(array: np.ndarray, needed: int) -> np.ndarray:
+        if needed <= len(array):
+            return array
+        grown = np.zeros((max(needed, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+    
+    def append(self, artwork: Artwork):
+        row = self.size
+        self._styles = self._grow(self._styles, row + 1)
+        self._tag_counts = self._grow(self._tag_counts, row + 1)
+        # Unknown styles get the extra code len(style_names), which never matches
+        self._styles[row] = self.style_codes.get(artwork.style, len(self.style_names))
+        tags = set(artwork.tags)
+        self._tag_counts[row] = len(tags)
+        cols = [self.tag_codes.setdefault(tag, len(self.tag_codes)) for tag in tags]
+        self._tag_rows = self._grow(self._tag_rows, self.nnz + len(cols))
+        self._tag_cols = self._grow(self._tag_cols, self.nnz + len(cols))
+        self._tag_rows[self.nnz:self.nnz + len(cols)] = row
+        self._tag_cols[self.nnz:self.nnz + len(cols)] = cols
+        self.nnz += len(cols)
+        self.rows[artwork.id] = row
+        self.ids.append(artwork.id)
+        self.size += 1
+    
+    def sync(self, artworks: List[Artwork]) -> "ArtworkFeatures":
+        """Index artworks appended since the last sync"""
+        if artworks is not self._source or len(artworks) < self.size:
+            self.__init__(self.style_names)
+            self._source = artworks
+        if hasattr(artworks, "feature_columns"):
+            self._append_columns(*artworks.feature_columns(self.size))
+        else:
+            for artwork in iter_summaries(artworks, self.size):
+                self.append(artwork)
+        return self
+    
+    def _append_columns(self, ids: List[str], styles: np.ndarray, style_names: List[str],
+                        tag_ids: np.ndarray, tag_ends: np.ndarray, tag_names: List[str]):
+        """Index rows handed over as columns by a catalogue, without visiting each artwork"""
+        count = len(ids)
+        if not count:
+            return
+        start = self.size
+        # Translate the catalogue's style and tag codes into this index's codes
+        style_map = np.array([self.style_codes.get(name, len(self.style_names)) for name in style_names],
+                             dtype=np.int32)
+        new_tags = [self.tag_codes.setdefault(name, len(self.tag_codes))
+                    for name in tag_names[len(self._source_tags):]]
+        self._source_tags = np.concatenate([self._source_tags, np.array(new_tags, dtype=np.int32)])
+        
+        # One entry per distinct tag of each artwork, as append() records them
+        rows = np.repeat(np.arange(start, start + count, dtype=np.int64), np.diff(tag_ends, prepend=0))
+        keys = np.unique(rows * len(self.tag_codes) + self._source_tags[tag_ids])
+        rows, cols = np.divmod(keys, len(self.tag_codes)) if len(keys) else (keys, keys)
+        
+        self._styles = self._grow(self._styles, start + count)
+        self._tag_counts = self._grow(self._tag_counts, start + count)
+        self._styles[start:start + count] = style_map[styles]
+        self._tag_counts[start:start + count] = np.bincount(rows - start, minlength=count)
+        self._tag_rows = self._grow(self._tag_rows, self.nnz + len(keys))
+        self._tag_cols = self._grow(self._tag_cols, self.nnz + len(keys))
+        self._tag_rows[self.nnz:self.nnz + len(keys)] = rows
+        self._tag_cols[self.nnz:self.nnz + len(keys)] = cols
+        self.nnz += len(keys)
+        self.rows.update(zip(ids, range(start, start + count)))
+        self.ids.extend(ids)
+        self.size += count
+    
+    @property
+    def styles(self) -> np.ndarray:
+        return self._styles[:self.size]
+    
+    @property
+    def tag_counts(self) -> np.ndarray:
+        return self._tag_counts[:self.size]
+    
+    @property
+    def tag_rows(self) -> np.ndarray:
+        return self._tag_rows[:self.nnz]
+    
+    @property
+    def tag_cols(self) -> np.ndarray:
+        return self._tag_cols[:self.nnz]
+
+class RecommendationCache:
+    """Bounded LRU cache of ranked recommendations, keyed by tuples whose first item is the owner"""
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # bumped on every invalidation
+        self._entries: "OrderedDict[Tuple, List[Tuple[Artwork, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[List[Tuple[Artwork, float]]]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+    
+    def put(self, key: Tuple, value: List[Tuple[Artwork, float]], generation: int):
+        """Store a result computed at the given generation, unless it was invalidated since"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate_user(self, owner):
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if key[0] == owner]:
+                del self._entries[key]
+    
+    def invalidate_all(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
 
 class RecommendationEngine:
     """AI-powered art recommendation system"""
     
-    def __init__(self):
+    def __init__(self, vectorized: bool = True, shared_cache_size: int = 256):
         self.style_vectors = self._create_style_vectors()
         self.color_vectors = self._create_color_vectors()
+        # Rankings shared by every profile with the same signature, such as
+        # the identical default profiles of new sessions; 0 disables it
+        self.shared_cache = RecommendationCache(shared_cache_size) if shared_cache_size else None
+        self._cache_source = None
+        # Held while the feature columns are synced and read, so a request never
+        # scores columns that another thread is still appending to
+        self._features_lock = threading.RLock()
+        self._build_style_similarity()
+        # Vectorized mode scores the whole catalogue with array operations;
+        # otherwise calculate_similarity runs once per artwork
+        self.vectorized = vectorized
+        self._features: Optional[ArtworkFeatures] = None
     
     def _create_style_vectors(self) -> Dict[str, List[float]]:
         """Create vector representations for art styles"""
@@ -96,6 +633,25 @@ class RecommendationEngine:
             "classical": [0.3, 0.8, 0.9, 0.4, 0.6]
         }
     
+    def _build_style_similarity(self):
+        """Precompute the cosine similarity between every pair of styles"""
+        self.style_names = list(self.style_vectors)
+        self.style_index = {name: i for i, name in enumerate(self.style_names)}
+        vectors = np.array([self.style_vectors[name] for name in self.style_names], dtype=np.float64)
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.style_similarity = unit @ unit.T
+        # Plain floats for single lookups, which are cheaper than indexing NumPy
+        self._style_similarity_rows = self.style_similarity.tolist()
+        with self._features_lock:
+            self._features = None
+        if self.shared_cache is not None:
+            self.shared_cache.invalidate_all()
+    
+    def add_style(self, name: str, vector: List[float]):
+        """Register or replace a style vector and rebuild the similarity table"""
+        self.style_vectors[name] = list(vector)
+        self._build_style_similarity()
+    
     def _create_color_vectors(self) -> Dict[str, List[float]]:
         """Create vector representations for color preferences"""
         return {
@@ -106,22 +662,23 @@ class RecommendationEngine:
             "muted": [0.3, 0.4, 0.6, 0.3, 0.5]
         }
     
-    def calculate_similarity(self, user_profile: UserProfile, artwork: Artwork) -> float:
-        """Calculate similarity score between user preferences and artwork"""
+    def calculate_similarity(self, user_profile: UserProfile, artwork: Artwork,
+                             tag_overlap: Optional[int] = None) -> float:
+        """Calculate similarity score between user preferences and artwork
+        
+        tag_overlap is the number of the user's tags the artwork carries, when
+        already known from a tag index; otherwise the tag sets are intersected.
+        """
         style_score = 0.0
         color_score = 0.0
         tag_score = 0.0
         
         # Style similarity
-        if artwork.style in self.style_vectors:
-            artwork_style_vec = self.style_vectors[artwork.style]
+        if artwork.style in self.style_index:
+            similarities = self._style_similarity_rows[self.style_index[artwork.style]]
             for pref_style in user_profile.preferred_styles:
-                if pref_style in self.style_vectors:
-                    pref_vec = self.style_vectors[pref_style]
-                    similarity = np.dot(artwork_style_vec, pref_vec) / (
-                        np.linalg.norm(artwork_style_vec) * np.linalg.norm(pref_vec)
-                    )
-                    style_score = max(style_score, similarity)
+                if pref_style in self.style_index:
+                    style_score = max(style_score, similarities[self.style_index[pref_style]])
         
         # Color similarity
         for color in user_profile.preferred_colors:
@@ -131,10 +688,14 @@ class RecommendationEngine:
                 color_score += 0.2  # Simplified for demo
         
         # Tag-based similarity
-        user_tags = set(user_profile.liked_artworks)  # Simplified
-        artwork_tags = set(artwork.tags)
-        if artwork_tags:
-            tag_score = len(user_tags.intersection(artwork_tags)) / len(artwork_tags)
+        if tag_overlap is not None:
+            if tag_overlap:
+                tag_score = tag_overlap / len(set(artwork.tags))
+        else:
+            user_tags = user_profile.liked_artworks  # Simplified
+            artwork_tags = set(artwork.tags)
+            if artwork_tags:
+                tag_score = sum(1 for tag in artwork_tags if tag in user_tags) / len(artwork_tags)
         
         # Historical preference weighting
         history_boost = 1.0
@@ -145,29 +706,334 @@ class RecommendationEngine:
         final_score = (0.4 * style_score + 0.3 * color_score + 0.3 * tag_score) * history_boost
         return min(final_score, 1.0)
     
+    @staticmethod
+    def tag_overlaps(user_profile: UserProfile, tag_index: Dict[str, List[str]]) -> Counter:
+        """Count the user's tags per artwork id, visiting only artworks that share a tag"""
+        overlaps = Counter()
+        for tag in set(user_profile.liked_artworks):  # Simplified
+            overlaps.update(tag_index.get(tag, ()))
+        return overlaps
+    
+    def score_artworks(self, user_profile: UserProfile, artworks: List[Artwork],
+                       tag_index: Optional[Dict[str, List[str]]] = None) -> np.ndarray:
+        """Score every artwork for a user at once, with the same weighting as calculate_similarity"""
+        with self._features_lock:
+            return self._score_features(user_profile, artworks, tag_index)
+    
+    def _score_features(self, user_profile: UserProfile, artworks: List[Artwork],
+                        tag_index: Optional[Dict[str, List[str]]]) -> np.ndarray:
+        if self._features is None:
+            self._features = ArtworkFeatures(self.style_names)
+        features = self._features.sync(artworks)
+        n = features.size
+        
+        # Style similarity: best match to a preferred style for each style, read
+        # from the precomputed table and gathered per artwork
+        best_by_style = np.zeros(len(self.style_names) + 1)
+        pref_codes = [self.style_index[style] for style in user_profile.preferred_styles
+                      if style in self.style_index]
+        if pref_codes:
+            best_by_style[:-1] = np.maximum(self.style_similarity[:, pref_codes].max(axis=1), 0.0)
+        style_score = best_by_style[features.styles]
+        
+        # Color similarity (simplified for demo, independent of the artwork)
+        color_score = 0.2 * sum(1 for color in user_profile.preferred_colors
+                                if color in self.color_vectors)
+        
+        # Tag-based similarity: with a tag index only artworks sharing a tag are
+        # touched, otherwise overlap counts come from one bincount over all tags
+        tag_score = np.zeros(n)
+        if tag_index is not None:
+            overlaps = self.tag_overlaps(user_profile, tag_index)
+            rows = [features.rows[artwork_id] for artwork_id in overlaps if artwork_id in features.rows]
+            if rows:
+                counts = np.array([overlaps[features.ids[row]] for row in rows], dtype=np.float64)
+                tag_score[rows] = counts / features.tag_counts[rows]
+            user_tags = []
+        else:
+            user_tags = [features.tag_codes[tag] for tag in set(user_profile.liked_artworks)  # Simplified
+                         if tag in features.tag_codes]
+        if user_tags:
+            user_tag_mask = np.zeros(len(features.tag_codes))
+            user_tag_mask[user_tags] = 1.0
+            overlap = np.bincount(features.tag_rows, weights=user_tag_mask[features.tag_cols],
+                                  minlength=n)
+            np.divide(overlap, features.tag_counts, out=tag_score, where=features.tag_counts > 0)
+        
+        # Historical preference weighting
+        history_boost = np.ones(n)
+        history_boost[self._viewed_rows(features, user_profile)] = 0.5
+        
+        final_score = (0.4 * style_score + 0.3 * color_score + 0.3 * tag_score) * history_boost
+        return np.minimum(final_score, 1.0)
+    
+    @staticmethod
+    def _viewed_rows(features: ArtworkFeatures, user_profile: UserProfile) -> List[int]:
+        """Feature rows of the artworks in a user's viewing history"""
+        return [features.rows[artwork_id] for artwork_id in user_profile.viewing_history
+                if artwork_id in features.rows]
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, ordered like a stable descending sort"""
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            # Everything above the k-th score is in; ties at the boundary are
+            # filled in index order, which is where a stable sort puts them
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:k - len(above)]
+            selected = np.concatenate([above, ties])
+            selected.sort()
+        else:
+            selected = np.arange(len(scores))
+        return selected[np.argsort(-scores[selected], kind="stable")]
+    
+    @staticmethod
+    def profile_signature(user_profile: UserProfile) -> Tuple:
+        """Everything about a profile that affects its scores, independent of list order"""
+        return (
+            frozenset(user_profile.preferred_styles),
+            tuple(sorted(user_profile.preferred_colors)),  # each known color adds to the score
+            frozenset(user_profile.liked_artworks),
+            frozenset(user_profile.viewing_history)
+        )
+    
     def recommend_artworks(self, user_profile: UserProfile, artworks: List[Artwork], 
-                          count: int = 10) -> List[Tuple[Artwork, float]]:
-        """Recommend artworks based on user profile"""
-        scored_artworks = []
+                          count: int = 10, offset: int = 0,
+                          tag_index: Optional[Dict[str, List[str]]] = None) -> List[Tuple[Artwork, float]]:
+        """Recommend artworks based on user profile, skipping the first offset results"""
+        offset = max(offset, 0)
+        if self.shared_cache is None:
+            return self._rank(user_profile, artworks, count, offset, tag_index)
         
-        for artwork in artworks:
+        if artworks is not self._cache_source:
+            self.shared_cache.invalidate_all()
+            self._cache_source = artworks
+        # The length tells appended catalogues apart
+        key = (self.profile_signature(user_profile), len(artworks), count, offset)
+        recommendations = self.shared_cache.get(key)
+        if recommendations is None:
+            generation = self.shared_cache.generation
+            recommendations = self._rank(user_profile, artworks, count, offset, tag_index)
+            self.shared_cache.put(key, recommendations, generation)
+        return list(recommendations)
+    
+    def _rank(self, user_profile: UserProfile, artworks: List[Artwork], count: int, offset: int,
+              tag_index: Optional[Dict[str, List[str]]]) -> List[Tuple[Artwork, float]]:
+        if self.vectorized:
+            with self._features_lock:
+                scores = self._score_features(user_profile, artworks, tag_index)
+                unviewed = np.ones(len(scores), dtype=bool)
+                unviewed[self._viewed_rows(self._features, user_profile)] = False
+            candidates = np.flatnonzero(unviewed)
+            # Stable, like list.sort, so ties keep catalogue order
+            order = candidates[self._top_k(scores[candidates], offset + count)][offset:]
+            return [(artworks[i], float(scores[i])) for i in order]
+        
+        scored_artworks = []
+        overlaps = self.tag_overlaps(user_profile, tag_index) if tag_index is not None else None
+
+        for i, artwork in enumerate(iter_summaries(artworks)):
             if artwork.id not in user_profile.viewing_history:
-                score = self.calculate_similarity(user_profile, artwork)
-                scored_artworks.append((artwork, score))
+                tag_overlap = overlaps.get(artwork.id, 0) if overlaps is not None else None
+                score = self.calculate_similarity(user_profile, artwork, tag_overlap)
+                scored_artworks.append((i, score))
         
-        # Sort by score and return top recommendations
-        scored_artworks.sort(key=lambda x: x[1], reverse=True)
-        return scored_artworks[:count]
+        # Keep only the top recommendations; nlargest is stable like sort
+        top = heapq.nlargest(max(offset + count, 0), scored_artworks, key=lambda x: x[1])
+        return [(artworks[i], score) for i, score in top[offset:]]
+
+class LazyArtwork:
+    """Stand-in for an artwork in a gallery data file, holding only the fields used for scoring"""
+    
+    __slots__ = ("id", "style", "tags", "ai_generated", "_source", "_offset", "_length")
+    
+    def __init__(self, data: Dict, source: Union[GalleryDataFile, SnapshotFile], offset: int, length: int):
+        self.id = data["id"]
+        self.style = data["style"]
+        self.tags = data["tags"]
+        self.ai_generated = data.get("ai_generated", False)
+        self._source = source
+        self._offset = offset
+        self._length = length
+    
+    def hydrate(self) -> Artwork:
+        """Read the full artwork back from the data file"""
+        return Artwork(**self._source.read_record(self._offset, self._length))
+
+class ArtworkRegistry:
+    """Artworks in insertion order with O(1) lookup by id and running counts
+    
+    Behaves like a read-only list of artworks (len, iteration, indexing) so the
+    recommendation engine can score it directly; artworks are added with add().
+    Entries may be LazyArtwork stand-ins, which are replaced by the full Artwork
+    the first time they are read; summaries() returns entries without doing so.
+    """
+    
+    def __init__(self, artworks: Optional[List[Artwork]] = None):
+        self._artworks: List = []
+        self._by_id: Dict[str, int] = {}  # id -> position
+        self.style_counts: Counter = Counter()
+        self.ai_count = 0
+        self._lock = threading.Lock()
+        self.extend(artworks or [])
+    
+    def add(self, artwork):
+        """Append an Artwork or LazyArtwork, raising ValueError if its id is already registered"""
+        with self._lock:
+            if artwork.id in self._by_id:
+                raise ValueError(f"Duplicate artwork id: {artwork.id}")
+            self._by_id[artwork.id] = len(self._artworks)
+            self._artworks.append(artwork)
+            self.style_counts[artwork.style] += 1
+            if artwork.ai_generated:
+                self.ai_count += 1
+    
+    def extend(self, artworks: List[Artwork]):
+        for artwork in artworks:
+            self.add(artwork)
+    
+    def get(self, artwork_id: str) -> Optional[Artwork]:
+        index = self._by_id.get(artwork_id)
+        return self[index] if index is not None else None
+    
+    def summaries(self, start: int = 0):
+        """Entries from a position on, without hydrating them"""
+        return iter(self._artworks[start:])
+    
+    def snapshot(self) -> List[Artwork]:
+        """Every artwork in order, reading lazy entries without keeping them hydrated"""
+        with self._lock:
+            entries = list(self._artworks)
+        return [entry.hydrate() if isinstance(entry, LazyArtwork) else entry for entry in entries]
+    
+    def _hydrate(self, index: int) -> Artwork:
+        with self._lock:
+            entry = self._artworks[index]
+            if isinstance(entry, LazyArtwork):
+                entry = self._artworks[index] = entry.hydrate()
+            return entry
+    
+    def styles(self) -> List[str]:
+        """Styles present in the gallery, in order of first appearance"""
+        return list(self.style_counts)
+    
+    def __contains__(self, artwork_id: str) -> bool:
+        return artwork_id in self._by_id
+    
+    def __len__(self) -> int:
+        return len(self._artworks)
+    
+    def __iter__(self):
+        for index in range(len(self._artworks)):
+            yield self[index]
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._artworks)))]
+        entry = self._artworks[index]
+        return self._hydrate(index) if isinstance(entry, LazyArtwork) else entry
 
 class VirtualGalleryManager:
     """Main class for managing the AI-curated virtual art gallery"""
     
-    def __init__(self):
-        self.artworks: List[Artwork] = []
-        self.users: Dict[str, UserProfile] = {}
+    # Standard image sizes kept for every artwork; the first is the master
+    # render and each smaller level is downsampled from the one before it
+    IMAGE_PYRAMID = {
+        "full": (800, 600),
+        "card": (400, 300),
+        "thumb": (200, 150)
+    }
+    
+    def __init__(self, image_store: Optional[ThumbnailStore] = None,
+                 image_encoder: Optional[ImageEncoder] = None,
+                 user_store: Optional[UserStore] = None, data_file: Optional[str] = None,
+                 interaction_log: Optional[InteractionLog] = None, storage: Optional[SQLiteStorage] = None,
+                 snapshot_file: Optional[str] = None, columnar: bool = False):
+        # Artworks and users live in memory unless a storage backend is given;
+        # columnar keeps artworks in an ArtworkCatalogue rather than as objects
+        if storage is not None:
+            self.artworks = storage.artworks
+            self.users = storage.users
+        else:
+            self.artworks = ArtworkCatalogue(Artwork) if columnar else ArtworkRegistry()
+            self.users = user_store if user_store is not None else UserStore(UserProfile)
+        self.tag_index: Dict[str, List[str]] = {}  # tag -> ids of artworks carrying it
+        # Views and likes summed over all profiles, kept current for the dashboard
+        self.interaction_counts: Counter = Counter()
         self.recommendation_engine = RecommendationEngine()
+        self.recommendation_cache = RecommendationCache()
         self.art_generator = AIArtGenerator()
-        self._load_sample_data()
+        self.image_store = image_store
+        self.image_encoder = image_encoder or ImageEncoder()
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self.interaction_log = None
+        if len(self.artworks):
+            # Storage that already holds a gallery
+            for artwork in iter_summaries(self.artworks):
+                self._index_tags(artwork)
+            self.interaction_counts.update(self.users.interaction_totals())
+        elif data_file and os.path.exists(data_file):
+            self.load_gallery_data(data_file)
+        else:
+            self._load_sample_data()
+        if interaction_log is not None:
+            # Changes since the last snapshot; replayed before logging starts
+            for record in interaction_log.replay():
+                self._apply_logged(record)
+            # Compaction writes to snapshot_file, which defaults to the file loaded from
+            snapshot_file = snapshot_file or data_file or "gallery_data.json"
+            interaction_log.open(lambda: self.save_gallery_data(snapshot_file))
+            self.interaction_log = interaction_log
+    
+    def _log(self, record_type: str, **fields):
+        if self.interaction_log is not None:
+            self.interaction_log.append({"type": record_type, **fields})
+    
+    def _apply_logged(self, record: Dict):
+        """Reapply one interaction log record; applying a record twice has no further effect"""
+        record_type = record.get("type")
+        if record_type == "user":
+            self.add_user(UserProfile(**record["profile"]), record.get("anonymous", False))
+        elif record_type == "artwork":
+            if record["artwork"]["id"] not in self.artworks:
+                self.add_artwork(Artwork(**record["artwork"]))
+        elif record_type == "interaction":
+            self.update_user_interaction(record["user_id"], record["artwork_id"], record["interaction"])
+        elif record_type == "preferences":
+            self.update_user_preferences(record["user_id"], record.get("preferred_styles"),
+                                         record.get("preferred_colors"))
+    
+    def load_gallery_data(self, filename: str = "gallery_data.json"):
+        """Restore artworks and users written by save_gallery_data
+        
+        The file is read incrementally and artworks are registered as LazyArtwork
+        entries, so only the fields needed for scoring are held until an artwork
+        is actually read. Binary snapshots and JSON files are both accepted.
+        """
+        source = SnapshotFile(filename) if is_snapshot(filename) else GalleryDataFile(filename)
+        # Only the registry defers reading; other backends store every field
+        lazy = isinstance(self.artworks, ArtworkRegistry)
+        batch = []
+        for kind, key, data in source.iter_records():
+            if kind == "artwork":
+                offset, length = key
+                batch.append(LazyArtwork(data, source, offset, length) if lazy else Artwork(**data))
+                if len(batch) >= 1000:
+                    self._add_loaded(batch)
+                    batch = []
+            elif kind == "user":
+                # Restored sessions stay subject to the user store's memory cap
+                self.add_user(UserProfile(**data), anonymous=True)
+        self._add_loaded(batch)
+    
+    def _add_loaded(self, artworks: List[Artwork]):
+        # Added in batches so storage backends can insert them in bulk
+        self.artworks.extend(artworks)
+        for artwork in artworks:
+            self._index_tags(artwork)
     
     def _load_sample_data(self):
         """Load sample artworks and user data"""
@@ -330,6 +1196,8 @@ class VirtualGalleryManager:
             )
         ]
         self.artworks.extend(sample_artworks)
+        for artwork in sample_artworks:
+            self._index_tags(artwork)
         
         # Sample user profile
         sample_user = UserProfile(
@@ -340,34 +1208,129 @@ class VirtualGalleryManager:
             viewing_history=[],
             interaction_weights={"style": 0.4, "color": 0.3, "tags": 0.3}
         )
-        self.users["user001"] = sample_user
+        self.add_user(sample_user)
+    
+    def add_user(self, user_profile: UserProfile, anonymous: bool = False):
+        """Add a new user profile; anonymous profiles may be evicted from memory when idle"""
+        previous = self.users.get(user_profile.user_id)
+        if previous is not None:
+            self.interaction_counts["views"] -= len(previous.viewing_history)
+            self.interaction_counts["likes"] -= len(previous.liked_artworks)
+        self.users.add(user_profile, anonymous)
+        self.interaction_counts["views"] += len(user_profile.viewing_history)
+        self.interaction_counts["likes"] += len(user_profile.liked_artworks)
+        self.recommendation_cache.invalidate_user(user_profile.user_id)
+        self._log("user", profile=asdict(user_profile), anonymous=anonymous)
     
-    def add_user(self, user_profile: UserProfile):
-        """Add a new user profile"""
-        self.users[user_profile.user_id] = user_profile
+    def add_listener(self, callback: Callable[[str, Dict], None]):
+        """Register a callback invoked as callback(event, payload) on gallery changes"""
+        self._listeners.append(callback)
+    
+    def _notify(self, event: str, payload: Dict):
+        for callback in self._listeners:
+            try:
+                callback(event, payload)
+            except Exception:
+                # The change has already happened; a failing listener must not
+                # make it look as if it did not, or keep the others from hearing
+                logger.exception("Gallery listener failed on %s", event)
     
     def add_artwork(self, artwork: Artwork):
         """Add a new artwork to the gallery"""
-        self.artworks.append(artwork)
+        self.artworks.add(artwork)
+        self._index_tags(artwork)
+        self.recommendation_cache.invalidate_all()
+        self._log("artwork", artwork=asdict(artwork))
+        self._notify("artwork_added", asdict(artwork))
+    
+    def _index_tags(self, artwork: Artwork):
+        for tag in set(artwork.tags):
+            self.tag_index.setdefault(tag, []).append(artwork.id)
+    
+    def image_render_spec(self, artwork: Artwork) -> Dict:
+        """generate_abstract_art arguments that reproduce an artwork's image"""
+        return {
+            "color_scheme": AIArtGenerator.color_scheme_for(artwork.color_palette),
+            "seed": AIArtGenerator.seed_for(artwork.id)
+        }
+    
+    def image_key(self, artwork: Artwork, width: int, height: int,
+                  fmt: str = "png") -> str:
+        """Image store key for an artwork rendered at a given size and format"""
+        return ThumbnailStore.make_key(artwork.id, width, height, fmt,
+                                       quality=self.image_encoder.quality.get(fmt),
+                                       **self.image_render_spec(artwork))
+    
+    def _store_pyramid(self, artwork: Artwork, levels: List[bytes], fmt: str):
+        for size, data in zip(self.IMAGE_PYRAMID.values(), levels):
+            self.image_store.put(self.image_key(artwork, *size, fmt), data)
+    
+    def _render_pyramids(self, artworks: List[Artwork], fmt: str) -> List[List[bytes]]:
+        pyramids = AIArtGenerator.render_pyramids(
+            [self.image_render_spec(artwork) for artwork in artworks],
+            list(self.IMAGE_PYRAMID.values()),
+            self.image_encoder.options(fmt)
+        )
+        for levels in pyramids:
+            for data, seconds in levels:
+                self.image_encoder.record(fmt, seconds, len(data))
+        return [[data for data, _ in levels] for levels in pyramids]
+    
+    def ensure_image_pyramids(self, artworks: List[Artwork], fmt: Optional[str] = None):
+        """Render and store, in one parallel batch, the pyramid of every artwork missing a level"""
+        if self.image_store is None:
+            return
+        fmt = fmt or self.image_encoder.default_format
+        sizes = list(self.IMAGE_PYRAMID.values())
+        missing = [artwork for artwork in artworks
+                   if any(self.image_key(artwork, *size, fmt) not in self.image_store for size in sizes)]
+        if not missing:
+            return
+        for artwork, levels in zip(missing, self._render_pyramids(missing, fmt)):
+            self._store_pyramid(artwork, levels, fmt)
+    
+    def get_image(self, artwork: Artwork, width: int, height: int,
+                  fmt: Optional[str] = None) -> bytes:
+        """Encoded image of an artwork at a pyramid size, rendering the pyramid on a miss"""
+        fmt = fmt or self.image_encoder.default_format
+        sizes = list(self.IMAGE_PYRAMID.values())
+        if (width, height) not in sizes:
+            raise ValueError(f"{width}x{height} is not an image pyramid size")
+        if self.image_store is not None:
+            data = self.image_store.get(self.image_key(artwork, width, height, fmt))
+            if data is not None:
+                return data
+        levels = self._render_pyramids([artwork], fmt)[0]
+        if self.image_store is not None:
+            self._store_pyramid(artwork, levels, fmt)
+        return levels[sizes.index((width, height))]
+    
+    def get_artwork(self, artwork_id: str) -> Optional[Artwork]:
+        """Look up an artwork by id"""
+        return self.artworks.get(artwork_id)
     
     def generate_ai_artwork(self, style_preference: str = "vibrant", 
                           title: str = None) -> Artwork:
         """Generate a new AI artwork"""
-        # Generate the image
-        image = self.art_generator.generate_abstract_art(color_scheme=style_preference)
-        
         # Create artwork metadata
         artwork_id = hashlib.md5(f"{datetime.now()}{random.random()}".encode()).hexdigest()[:8]
         
+        # Generate the master image, reproducible from the artwork id
+        width, height = self.IMAGE_PYRAMID["full"]
+        image = self.art_generator.generate_abstract_art(
+            width=width, height=height,
+            color_scheme=style_preference, seed=AIArtGenerator.seed_for(artwork_id)
+        )
+        
         if not title:
-            title = f"AI Generated Art #{len([a for a in self.artworks if a.ai_generated]) + 1}"
+            title = f"AI Generated Art #{self.artworks.ai_count + 1}"
         
         artwork = Artwork(
             id=artwork_id,
             title=title,
             artist="AI Gallery Generator",
             style="abstract",
-            color_palette=["#FF6B6B", "#4ECDC4", "#45B7D1"],  # Simplified
+            color_palette=AIArtGenerator.palette_for(style_preference),
             tags=["ai_generated", "abstract", style_preference],
             description=f"AI-generated artwork with {style_preference} color scheme",
             image_url=f"/generated/{artwork_id}.jpg",
@@ -375,21 +1338,30 @@ class VirtualGalleryManager:
             ai_generated=True
         )
         
-        # Save image (in real implementation)
-        # image.save(f"gallery_images/{artwork_id}.jpg")
+        # Persist the rendered image and the pyramid downscaled from it, so
+        # the stored artwork is exactly what was generated
+        if self.image_store is not None:
+            fmt = self.image_encoder.default_format
+            levels = AIArtGenerator.build_pyramid(image, list(self.IMAGE_PYRAMID.values()))
+            self._store_pyramid(artwork, [self.image_encoder.encode(level, fmt) for level in levels], fmt)
         
         self.add_artwork(artwork)
         return artwork
     
-    def get_recommendations(self, user_id: str, count: int = 10) -> List[Dict]:
+    def get_recommendations(self, user_id: str, count: int = 10, offset: int = 0) -> List[Dict]:
         """Get personalized artwork recommendations for a user"""
         if user_id not in self.users:
             return []
         
-        user_profile = self.users[user_id]
-        recommendations = self.recommendation_engine.recommend_artworks(
-            user_profile, self.artworks, count
-        )
+        key = (user_id, count, offset)
+        recommendations = self.recommendation_cache.get(key)
+        if recommendations is None:
+            generation = self.recommendation_cache.generation
+            user_profile = self.users[user_id]
+            recommendations = self.recommendation_engine.recommend_artworks(
+                user_profile, self.artworks, count, offset, self.tag_index
+            )
+            self.recommendation_cache.put(key, recommendations, generation)
         
         return [{
             **asdict(artwork),
@@ -402,12 +1374,55 @@ class VirtualGalleryManager:
         if user_id in self.users:
             user = self.users[user_id]
             
+            changed = False
+            
             if interaction_type == "view":
                 if artwork_id not in user.viewing_history:
                     user.viewing_history.append(artwork_id)
+                    self.interaction_counts["views"] += 1
+                    changed = True
             elif interaction_type == "like":
                 if artwork_id not in user.liked_artworks:
                     user.liked_artworks.append(artwork_id)
+                    self.interaction_counts["likes"] += 1
+                    changed = True
+            elif interaction_type == "unlike":
+                if artwork_id in user.liked_artworks:
+                    user.liked_artworks.remove(artwork_id)
+                    self.interaction_counts["likes"] -= 1
+                    changed = True
+            
+            if changed:
+                self.users.record_interaction(user_id, artwork_id, interaction_type)
+                self.recommendation_cache.invalidate_user(user_id)
+                self._log("interaction", user_id=user_id, artwork_id=artwork_id,
+                          interaction=interaction_type)
+    
+    def update_user_preferences(self, user_id: str, preferred_styles: Optional[List[str]] = None,
+                                preferred_colors: Optional[List[str]] = None):
+        """Replace a user's preferred styles and/or colors"""
+        if user_id in self.users:
+            user = self.users[user_id]
+            if preferred_styles is not None:
+                user.preferred_styles = preferred_styles
+            if preferred_colors is not None:
+                user.preferred_colors = preferred_colors
+            self.users.save_preferences(user)
+            self.recommendation_cache.invalidate_user(user_id)
+            self._log("preferences", user_id=user_id, preferred_styles=preferred_styles,
+                      preferred_colors=preferred_colors)
+    
+    def get_stats(self) -> Dict:
+        """Gallery totals for the admin dashboard, read from running counters"""
+        return {
+            "total_artworks": len(self.artworks),
+            "ai_generated_count": self.artworks.ai_count,
+            "total_users": len(self.users),
+            "styles": self.artworks.styles(),
+            "style_counts": dict(self.artworks.style_counts),
+            "total_views": self.interaction_counts["views"],
+            "total_likes": self.interaction_counts["likes"]
+        }
     
     def export_gallery_for_artsteps(self, user_id: str) -> Dict:
         """Export gallery data in a format suitable for Artsteps integration"""
@@ -427,14 +1442,25 @@ class VirtualGalleryManager:
         return gallery_data
     
     def save_gallery_data(self, filename: str = "gallery_data.json"):
-        """Save all gallery data to JSON file"""
-        data = {
-            "artworks": [asdict(artwork) for artwork in self.artworks],
-            "users": {uid: asdict(user) for uid, user in self.users.items()}
-        }
-        
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
+        """Save all gallery data to a JSON file, or to a binary snapshot if filename ends in .snap"""
+        # Written aside and swapped in, so a crash never leaves a partial file
+        tmp_filename = f"{filename}.tmp"
+        if filename.endswith(".snap"):
+            write_snapshot(tmp_filename, self.artworks.snapshot(),
+                           (asdict(user) for uid, user in self.users.items()))
+        else:
+            data = {
+                "artworks": [asdict(artwork) for artwork in self.artworks.snapshot()],
+                "users": {uid: asdict(user) for uid, user in self.users.items()}
+            }
+            with open(tmp_filename, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+        # Synced before the rename, and the rename synced after, so a power
+        # loss leaves either the old file or the complete new one
+        os.replace(tmp_filename, filename)
+        fsync_directory(filename)
         
         print(f"Gallery data saved to {filename}")
 
@@ -4,9 +4,10 @@
 Run the AI-Curated Virtual Art Gallery Web Application
 """
 
-from app import app
-
 if __name__ == '__main__':
+    # Imported here so render pool workers, which re-run this script, skip it
+    from app import app
+
     print("Starting AI-Curated Virtual Art Gallery...")
     print("Access your gallery at: http://localhost:5000")
     print("Admin dashboard at: http://localhost:5000/admin")
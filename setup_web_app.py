@@ -120,12 +120,22 @@ def create_templates():
                 <div class="stat-number">{{ stats.styles|length }}</div>
                 <div class="stat-label">Art Styles</div>
             </div>
+            
+            <div class="stat-card">
+                <div class="stat-number">{{ stats.total_views }}</div>
+                <div class="stat-label">Artwork Views</div>
+            </div>
+            
+            <div class="stat-card">
+                <div class="stat-number">{{ stats.total_likes }}</div>
+                <div class="stat-label">Likes</div>
+            </div>
         </div>
         
         <div class="styles-list">
-            <h3>Available Art Styles:</h3>
+            <h3>Artworks by Style:</h3>
             {% for style in stats.styles %}
-                <span class="style-tag">{{ style }}</span>
+                <span class="style-tag">{{ style }}<span class="style-count">{{ stats.style_counts[style] }}</span></span>
             {% endfor %}
         </div>
     </div>
@@ -265,6 +275,12 @@ body {
     position: relative;
 }
 
+.artwork-image img {
+    width: 100%;
+    height: 100%;
+    object-fit: cover;
+}
+
 .artwork-info {
     padding: 1.5rem;
 }
@@ -482,6 +498,15 @@ body {
     font-size: 0.9rem;
 }
 
+.style-count {
+    background: white;
+    color: #667eea;
+    border-radius: 10px;
+    padding: 0 0.5rem;
+    margin-left: 0.4rem;
+    font-weight: bold;
+}
+
 .back-btn {
     background: #667eea;
     color: white;
@@ -513,8 +538,12 @@ def create_javascript():
     
     gallery_js = '''// Gallery JavaScript functionality
 let likedArtworks = new Set();
+let currentView = null;
+let pendingJobId = null;
+let pendingButton = null;
 
 async function loadRecommendations() {
+    currentView = 'recommendations';
     document.getElementById('section-title').textContent = 'AI Recommendations For You';
     document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading your personalized recommendations...</div>';
     
@@ -534,6 +563,7 @@ async function loadRecommendations() {
 }
 
 async function loadAllArtworks() {
+    currentView = 'all';
     document.getElementById('section-title').textContent = 'All Gallery Artworks';
     document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading all artworks...</div>';
     
@@ -563,37 +593,69 @@ function displayArtworks(artworks, showScores = false) {
     grid.innerHTML = '';
     
     artworks.forEach(artwork => {
-        const isLiked = likedArtworks.has(artwork.id);
-        const score = artwork.recommendation_score;
-        
-        const artworkCard = document.createElement('div');
-        artworkCard.className = 'artwork-card';
-        artworkCard.innerHTML = `
-            <div class="artwork-image">
-                🎨
-                ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+        grid.appendChild(createArtworkCard(artwork, showScores));
+    });
+}
+
+function createArtworkCard(artwork, showScores = false) {
+    const isLiked = likedArtworks.has(artwork.id);
+    const score = artwork.recommendation_score;
+    
+    const artworkCard = document.createElement('div');
+    artworkCard.className = 'artwork-card';
+    artworkCard.innerHTML = `
+        <div class="artwork-image">
+            ${artwork.thumbnail_url ? `<img src="${artwork.thumbnail_url}" alt="${artwork.title}" loading="lazy">` : '🎨'}
+            ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+        </div>
+        <div class="artwork-info">
+            <div class="artwork-title">${artwork.title}</div>
+            <div class="artwork-artist">by ${artwork.artist}</div>
+            <div class="artwork-style">${artwork.style}</div>
+            <div class="artwork-tags">
+                ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
             </div>
-            <div class="artwork-info">
-                <div class="artwork-title">${artwork.title}</div>
-                <div class="artwork-artist">by ${artwork.artist}</div>
-                <div class="artwork-style">${artwork.style}</div>
-                <div class="artwork-tags">
-                    ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
-                </div>
-                <div class="artwork-actions">
-                    <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
-                        ${isLiked ? '❤️ Liked' : '🤍 Like'}
-                    </button>
-                </div>
+            <div class="artwork-actions">
+                <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
+                    ${isLiked ? '❤️ Liked' : '🤍 Like'}
+                </button>
             </div>
-        `;
-        
-        artworkCard.addEventListener('click', (e) => {
-            if (e.target.tagName !== 'BUTTON') {
-                viewArtwork(artwork.id);
+        </div>
+    `;
+    
+    artworkCard.addEventListener('click', (e) => {
+        if (e.target.tagName !== 'BUTTON') {
+            viewArtwork(artwork.id);
+        }
+    });
+    return artworkCard;
+}
+
+function connectEvents() {
+    // New artworks and generation progress are pushed by the server
+    const events = new EventSource('/api/events');
+    
+    events.addEventListener('artwork_added', (e) => {
+        const artwork = JSON.parse(e.data);
+        if (currentView === 'all') {
+            const grid = document.getElementById('artwork-grid');
+            if (!grid.querySelector('.artwork-card')) {
+                grid.innerHTML = '';
             }
-        });
-        grid.appendChild(artworkCard);
+            grid.appendChild(createArtworkCard(artwork, false));
+        }
+    });
+    
+    events.addEventListener('job', (e) => {
+        const job = JSON.parse(e.data);
+        if (job.job_id !== pendingJobId || !pendingButton) {
+            return;
+        }
+        if (job.status === 'queued') {
+            pendingButton.textContent = `Queued (position ${job.queue_depth})...`;
+        } else if (job.status === 'running') {
+            pendingButton.textContent = 'Rendering...';
+        }
     });
 }
 
@@ -658,6 +720,17 @@ function hideGenerateModal() {
     document.getElementById('colorScheme').value = 'vibrant';
 }
 
+async function waitForJob(statusUrl) {
+    // Long-poll the job until it has finished
+    while (true) {
+        const response = await fetch(`${statusUrl}?wait=25`);
+        const job = await response.json();
+        if (job.status !== 'queued' && job.status !== 'running') {
+            return job;
+        }
+    }
+}
+
 async function generateArt() {
     const title = document.getElementById('artTitle').value;
     const colorScheme = document.getElementById('colorScheme').value;
@@ -678,12 +751,20 @@ async function generateArt() {
             })
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        if (data.status === 'queued') {
+            pendingJobId = data.job_id;
+            pendingButton = generateButton;
+            data = await waitForJob(data.status_url);
+        }
         
         if (data.status === 'success') {
             alert(`Successfully generated: ${data.artwork.title}`);
             hideGenerateModal();
-            loadAllArtworks();
+            // The new card is pushed over /api/events when already browsing all artworks
+            if (currentView !== 'all') {
+                loadAllArtworks();
+            }
         } else {
             alert('Error generating artwork: ' + data.message);
         }
@@ -691,6 +772,8 @@ async function generateArt() {
         console.error('Error:', error);
         alert('Error generating artwork');
     } finally {
+        pendingJobId = null;
+        pendingButton = null;
         generateButton.disabled = false;
         generateButton.textContent = 'Generate Artwork';
     }
@@ -706,6 +789,7 @@ window.onclick = function(event) {
 
 // Load recommendations on page load
 window.onload = function() {
+    connectEvents();
     loadRecommendations();
 }'''
 
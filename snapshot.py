@@ -0,0 +1,177 @@
+import os
+import json
+import mmap
+import struct
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+MAGIC = b"GALSNAP\x00"
+VERSION = 1
+
+# magic, version, artwork count, user count, then the byte offsets of the
+# user records, the string table and the artwork offset index
+HEADER = struct.Struct("<8sIIIQQQ")
+LENGTH = struct.Struct("<I")
+
+# Fixed part of an artwork record: ai_generated, the interned artist, style
+# and created_date, the palette and tag counts, then the byte lengths of the
+# id, title, description and image_url that follow the interned list ids
+ARTWORK = struct.Struct("<BIIIHHIIII")
+
+def is_snapshot(filename: str) -> bool:
+    """Whether a file starts with the binary snapshot header"""
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def write_snapshot(filename: str, artworks: Iterable, users: Iterable[Dict]):
+    """Write artworks and user profile dicts as a binary snapshot
+
+    Records are written as they come, each prefixed with its length; the
+    string table and the offset index go at the end and the header is filled
+    in last, so the file is never held in memory as a whole. The file is
+    synced to disk before returning, so it can be renamed into place safely.
+    """
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        code = strings.get(value)
+        if code is None:
+            code = strings[value] = len(strings)
+        return code
+
+    offsets = array('Q')
+    artwork_count = user_count = 0
+    with open(filename, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        position = HEADER.size
+        for artwork in artworks:
+            ids = [intern(color) for color in artwork.color_palette] + [intern(tag) for tag in artwork.tags]
+            inline = [artwork.id.encode('utf-8'), artwork.title.encode('utf-8'),
+                      artwork.description.encode('utf-8'), artwork.image_url.encode('utf-8')]
+            record = b"".join([
+                ARTWORK.pack(bool(artwork.ai_generated), intern(artwork.artist), intern(artwork.style),
+                             intern(artwork.created_date), len(artwork.color_palette), len(artwork.tags),
+                             *map(len, inline)),
+                array('I', ids).tobytes(),
+                *inline
+            ])
+            f.write(LENGTH.pack(len(record)))
+            f.write(record)
+            offsets.append(position + LENGTH.size)
+            position += LENGTH.size + len(record)
+            artwork_count += 1
+
+        # Profiles vary in shape, so they are stored as compact JSON
+        users_offset = position
+        for profile in users:
+            record = json.dumps(profile, separators=(',', ':')).encode('utf-8')
+            f.write(LENGTH.pack(len(record)))
+            f.write(record)
+            position += LENGTH.size + len(record)
+            user_count += 1
+
+        strings_offset = position
+        f.write(LENGTH.pack(len(strings)))
+        position += LENGTH.size
+        for value in strings:
+            encoded = value.encode('utf-8')
+            f.write(LENGTH.pack(len(encoded)))
+            f.write(encoded)
+            position += LENGTH.size + len(encoded)
+        index_offset = position
+        f.write(offsets.tobytes())
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, artwork_count, user_count, users_offset, strings_offset, index_offset))
+        f.flush()
+        os.fsync(f.fileno())
+
+class SnapshotFile:
+    """Reader for binary snapshots written by write_snapshot()
+
+    The file is memory-mapped, and the header index gives the offset of every
+    artwork, so artwork(i) or read_record() decodes a single record without
+    touching the rest. iter_records() yields the same tuples as
+    GalleryDataFile, so either can back LazyArtwork entries.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            # The mapping stays valid if the file is later replaced
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.artwork_count, self.user_count, self._users_offset, strings_offset, \
+            self._index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a gallery snapshot")
+        if version != VERSION:
+            raise ValueError(f"Unsupported gallery snapshot version {version}")
+        self._strings = self._read_strings(strings_offset)
+
+    def _read_strings(self, offset: int) -> List[str]:
+        data = self._map
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        strings = []
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            strings.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        return strings
+
+    def _decode_artwork(self, offset: int) -> Dict:
+        data, strings = self._map, self._strings
+        ai_generated, artist, style, created, colors, tags, id_length, title_length, description_length, \
+            url_length = ARTWORK.unpack_from(data, offset)
+        offset += ARTWORK.size
+        ids = struct.unpack_from(f"<{colors + tags}I", data, offset)
+        offset += 4 * (colors + tags)
+        fields = []
+        for length in (id_length, title_length, description_length, url_length):
+            fields.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+        return {
+            "id": fields[0],
+            "title": fields[1],
+            "artist": strings[artist],
+            "style": strings[style],
+            "color_palette": [strings[i] for i in ids[:colors]],
+            "tags": [strings[i] for i in ids[colors:]],
+            "description": fields[2],
+            "image_url": fields[3],
+            "created_date": strings[created],
+            "ai_generated": bool(ai_generated)
+        }
+
+    def iter_records(self) -> Iterator[Tuple[str, Any, Dict]]:
+        """Yield ("artwork", (offset, length), data) and ("user", user_id, data) in file order"""
+        data = self._map
+        offset = HEADER.size
+        for _ in range(self.artwork_count):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            yield "artwork", (offset, length), self._decode_artwork(offset)
+            offset += length
+        offset = self._users_offset
+        for _ in range(self.user_count):
+            (length,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            profile = json.loads(data[offset:offset + length])
+            yield "user", profile["user_id"], profile
+            offset += length
+
+    def read_record(self, offset: int, length: int) -> Dict:
+        """Decode the artwork stored at a byte range reported by iter_records()"""
+        return self._decode_artwork(offset)
+
+    def artwork(self, index: int) -> Dict:
+        """Decode the artwork at a position, found through the header index"""
+        if not 0 <= index < self.artwork_count:
+            raise IndexError("artwork index out of range")
+        (offset,) = struct.unpack_from("<Q", self._map, self._index_offset + 8 * index)
+        return self._decode_artwork(offset)
+
+    def close(self):
+        if not self._map.closed:
+            self._map.close()
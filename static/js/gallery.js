@@ -1,7 +1,11 @@
 // Gallery JavaScript functionality
 let likedArtworks = new Set();
+let currentView = null;
+let pendingJobId = null;
+let pendingButton = null;
 
 async function loadRecommendations() {
+    currentView = 'recommendations';
     document.getElementById('section-title').textContent = 'AI Recommendations For You';
     document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading your personalized recommendations...</div>';
     
@@ -21,6 +25,7 @@ async function loadRecommendations() {
 }
 
 async function loadAllArtworks() {
+    currentView = 'all';
     document.getElementById('section-title').textContent = 'All Gallery Artworks';
     document.getElementById('artwork-grid').innerHTML = '<div class="loading">Loading all artworks...</div>';
     
@@ -50,37 +55,69 @@ function displayArtworks(artworks, showScores = false) {
     grid.innerHTML = '';
     
     artworks.forEach(artwork => {
-        const isLiked = likedArtworks.has(artwork.id);
-        const score = artwork.recommendation_score;
-        
-        const artworkCard = document.createElement('div');
-        artworkCard.className = 'artwork-card';
-        artworkCard.innerHTML = `
-            <div class="artwork-image">
-                🎨
-                ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+        grid.appendChild(createArtworkCard(artwork, showScores));
+    });
+}
+
+function createArtworkCard(artwork, showScores = false) {
+    const isLiked = likedArtworks.has(artwork.id);
+    const score = artwork.recommendation_score;
+    
+    const artworkCard = document.createElement('div');
+    artworkCard.className = 'artwork-card';
+    artworkCard.innerHTML = `
+        <div class="artwork-image">
+            ${artwork.thumbnail_url ? `<img src="${artwork.thumbnail_url}" alt="${artwork.title}" loading="lazy">` : '🎨'}
+            ${showScores && score ? `<div class="score">Score: ${score.toFixed(2)}</div>` : ''}
+        </div>
+        <div class="artwork-info">
+            <div class="artwork-title">${artwork.title}</div>
+            <div class="artwork-artist">by ${artwork.artist}</div>
+            <div class="artwork-style">${artwork.style}</div>
+            <div class="artwork-tags">
+                ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
             </div>
-            <div class="artwork-info">
-                <div class="artwork-title">${artwork.title}</div>
-                <div class="artwork-artist">by ${artwork.artist}</div>
-                <div class="artwork-style">${artwork.style}</div>
-                <div class="artwork-tags">
-                    ${artwork.tags.map(tag => `<span class="tag">${tag}</span>`).join('')}
-                </div>
-                <div class="artwork-actions">
-                    <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
-                        ${isLiked ? '❤️ Liked' : '🤍 Like'}
-                    </button>
-                </div>
+            <div class="artwork-actions">
+                <button class="like-btn ${isLiked ? 'liked' : ''}" onclick="toggleLike('${artwork.id}', this)">
+                    ${isLiked ? '❤️ Liked' : '🤍 Like'}
+                </button>
             </div>
-        `;
-        
-        artworkCard.addEventListener('click', (e) => {
-            if (e.target.tagName !== 'BUTTON') {
-                viewArtwork(artwork.id);
+        </div>
+    `;
+    
+    artworkCard.addEventListener('click', (e) => {
+        if (e.target.tagName !== 'BUTTON') {
+            viewArtwork(artwork.id);
+        }
+    });
+    return artworkCard;
+}
+
+function connectEvents() {
+    // New artworks and generation progress are pushed by the server
+    const events = new EventSource('/api/events');
+    
+    events.addEventListener('artwork_added', (e) => {
+        const artwork = JSON.parse(e.data);
+        if (currentView === 'all') {
+            const grid = document.getElementById('artwork-grid');
+            if (!grid.querySelector('.artwork-card')) {
+                grid.innerHTML = '';
             }
-        });
-        grid.appendChild(artworkCard);
+            grid.appendChild(createArtworkCard(artwork, false));
+        }
+    });
+    
+    events.addEventListener('job', (e) => {
+        const job = JSON.parse(e.data);
+        if (job.job_id !== pendingJobId || !pendingButton) {
+            return;
+        }
+        if (job.status === 'queued') {
+            pendingButton.textContent = `Queued (${job.queue_depth} in queue)...`;
+        } else if (job.status === 'running') {
+            pendingButton.textContent = 'Rendering...';
+        }
     });
 }
 
@@ -145,6 +182,17 @@ function hideGenerateModal() {
     document.getElementById('colorScheme').value = 'vibrant';
 }
 
+async function waitForJob(statusUrl) {
+    // Long-poll the job until it has finished
+    while (true) {
+        const response = await fetch(`${statusUrl}?wait=25`);
+        const job = await response.json();
+        if (job.status !== 'queued' && job.status !== 'running') {
+            return job;
+        }
+    }
+}
+
 async function generateArt() {
     const title = document.getElementById('artTitle').value;
     const colorScheme = document.getElementById('colorScheme').value;
@@ -165,12 +213,20 @@ async function generateArt() {
             })
         });
         
-        const data = await response.json();
+        let data = await response.json();
+        if (data.status === 'queued') {
+            pendingJobId = data.job_id;
+            pendingButton = generateButton;
+            data = await waitForJob(data.status_url);
+        }
         
         if (data.status === 'success') {
             alert(`Successfully generated: ${data.artwork.title}`);
             hideGenerateModal();
-            loadAllArtworks();
+            // The new card is pushed over /api/events when already browsing all artworks
+            if (currentView !== 'all') {
+                loadAllArtworks();
+            }
         } else {
             alert('Error generating artwork: ' + data.message);
         }
@@ -178,6 +234,8 @@ async function generateArt() {
         console.error('Error:', error);
         alert('Error generating artwork');
     } finally {
+        pendingJobId = null;
+        pendingButton = null;
         generateButton.disabled = false;
         generateButton.textContent = 'Generate Artwork';
     }
@@ -193,5 +251,6 @@ window.onclick = function(event) {
 
 // Load recommendations on page load
 window.onload = function() {
+    connectEvents();
     loadRecommendations();
 }
\ No newline at end of file
@@ -0,0 +1,326 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# What the recommender needs from an artwork, without its text fields
+ArtworkSummary = namedtuple("ArtworkSummary", ["id", "style", "tags", "ai_generated"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artworks (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    style TEXT NOT NULL,
+    color_palette TEXT NOT NULL,
+    description TEXT NOT NULL,
+    image_url TEXT NOT NULL,
+    created_date TEXT NOT NULL,
+    ai_generated INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artworks_style ON artworks (style);
+CREATE INDEX IF NOT EXISTS artworks_ai_generated ON artworks (ai_generated);
+CREATE TABLE IF NOT EXISTS artwork_tags (
+    seq INTEGER NOT NULL REFERENCES artworks (seq),
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (seq, position)
+);
+CREATE INDEX IF NOT EXISTS artwork_tags_tag ON artwork_tags (tag);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    preferred_styles TEXT NOT NULL,
+    preferred_colors TEXT NOT NULL,
+    interaction_weights TEXT NOT NULL,
+    anonymous INTEGER NOT NULL DEFAULT 0,
+    last_active REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_idle ON users (anonymous, last_active);
+CREATE TABLE IF NOT EXISTS likes (
+    user_id TEXT NOT NULL,
+    artwork_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, artwork_id)
+);
+CREATE TABLE IF NOT EXISTS views (
+    user_id TEXT NOT NULL,
+    artwork_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, artwork_id)
+);
+"""
+
+class SQLiteStorage:
+    """SQLite-backed artwork and user storage for VirtualGalleryManager
+
+    The database runs in WAL mode so readers do not block the writer. Each
+    thread gets its own connection; sqlite3 keeps the prepared form of every
+    statement used here in its per-connection statement cache. Only one
+    VirtualGalleryManager should use a database at a time, since its caches,
+    tag index and counters are not refreshed for writes made by another.
+    """
+
+    def __init__(self, path: str, artwork_type: type, profile_type: type, idle_ttl: float = 24 * 3600):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+        self.artworks = SQLiteArtworkStore(self, artwork_type)
+        self.users = SQLiteUserStore(self, profile_type, idle_ttl)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class SQLiteArtworkStore:
+    """Artwork table with the same interface as ArtworkRegistry
+
+    Positions are the insertion order kept in the seq column, so len() and
+    indexing work the same way and the recommender can score it unchanged.
+    Style and AI counts are read once when the store opens and kept up to
+    date by extend().
+    """
+
+    def __init__(self, storage: SQLiteStorage, artwork_type: type):
+        self.storage = storage
+        self.artwork_type = artwork_type
+        self._lock = threading.Lock()
+        conn = storage.connection()
+        rows = conn.execute("SELECT style, COUNT(*) FROM artworks GROUP BY style ORDER BY MIN(seq)")
+        self.style_counts = Counter(dict(rows.fetchall()))
+        self.ai_count = conn.execute("SELECT COUNT(*) FROM artworks WHERE ai_generated = 1").fetchone()[0]
+
+    def add(self, artwork):
+        """Insert an artwork, raising ValueError if its id is already stored"""
+        self.extend([artwork])
+
+    def extend(self, artworks: List[Any]):
+        """Insert artworks in one transaction"""
+        artworks = [artwork.hydrate() if hasattr(artwork, "hydrate") else artwork for artwork in artworks]
+        if not artworks:
+            return
+        conn = self.storage.connection()
+        try:
+            with conn:
+                # BEGIN IMMEDIATE takes the write lock up front, so seq numbers
+                # read here cannot be claimed by another process before insert
+                conn.execute("BEGIN IMMEDIATE")
+                start = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM artworks").fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO artworks (seq, id, title, artist, style, color_palette, description, "
+                    "image_url, created_date, ai_generated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(start + i, a.id, a.title, a.artist, a.style, json.dumps(a.color_palette), a.description,
+                      a.image_url, a.created_date, int(a.ai_generated)) for i, a in enumerate(artworks)]
+                )
+                conn.executemany(
+                    "INSERT INTO artwork_tags (seq, position, tag) VALUES (?, ?, ?)",
+                    [(start + i, position, tag) for i, a in enumerate(artworks) for position, tag in enumerate(a.tags)]
+                )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"Duplicate artwork id: {e}")
+        with self._lock:
+            for artwork in artworks:
+                self.style_counts[artwork.style] += 1
+                if artwork.ai_generated:
+                    self.ai_count += 1
+
+    def _tags(self, conn: sqlite3.Connection, seq: int) -> List[str]:
+        rows = conn.execute("SELECT tag FROM artwork_tags WHERE seq = ? ORDER BY position", (seq,))
+        return [tag for tag, in rows]
+
+    def _artwork(self, conn: sqlite3.Connection, row: Tuple) -> Any:
+        seq, artwork_id, title, artist, style, palette, description, image_url, created_date, ai = row
+        return self.artwork_type(
+            id=artwork_id, title=title, artist=artist, style=style, color_palette=json.loads(palette),
+            tags=self._tags(conn, seq), description=description, image_url=image_url,
+            created_date=created_date, ai_generated=bool(ai)
+        )
+
+    def get(self, artwork_id: str) -> Optional[Any]:
+        conn = self.storage.connection()
+        row = conn.execute("SELECT * FROM artworks WHERE id = ?", (artwork_id,)).fetchone()
+        return self._artwork(conn, row) if row is not None else None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = int(index)  # NumPy integers do not bind as SQLite integers
+        if index < 0:
+            index += len(self)
+        conn = self.storage.connection()
+        row = conn.execute("SELECT * FROM artworks WHERE seq = ?", (index,)).fetchone()
+        if row is None:
+            raise IndexError("artwork index out of range")
+        return self._artwork(conn, row)
+
+    def summaries(self, start: int = 0) -> Iterator[ArtworkSummary]:
+        """Summaries of every artwork from a position on, read with two range scans"""
+        conn = self.storage.connection()
+        tags: Dict[int, List[str]] = {}
+        for seq, tag in conn.execute(
+                "SELECT seq, tag FROM artwork_tags WHERE seq >= ? ORDER BY seq, position", (start,)):
+            tags.setdefault(seq, []).append(tag)
+        for seq, artwork_id, style, ai in conn.execute(
+                "SELECT seq, id, style, ai_generated FROM artworks WHERE seq >= ? ORDER BY seq", (start,)):
+            yield ArtworkSummary(artwork_id, style, tags.get(seq, []), bool(ai))
+
+    def __iter__(self):
+        conn = self.storage.connection()
+        for row in conn.execute("SELECT * FROM artworks ORDER BY seq").fetchall():
+            yield self._artwork(conn, row)
+
+    def snapshot(self) -> List[Any]:
+        return list(self)
+
+    def __contains__(self, artwork_id: str) -> bool:
+        conn = self.storage.connection()
+        return conn.execute("SELECT 1 FROM artworks WHERE id = ?", (artwork_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        # MAX on the integer primary key is a single index lookup, unlike COUNT(*)
+        conn = self.storage.connection()
+        return conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM artworks").fetchone()[0]
+
+    def styles(self) -> List[str]:
+        """Styles present in the gallery, in order of first appearance"""
+        return list(self.style_counts)
+
+class SQLiteUserStore:
+    """User profiles stored in SQLite with the same interface as UserStore
+
+    Profiles are read fresh on every lookup, so changes must be written back
+    through record_interaction() and save_preferences(). Anonymous users
+    with no likes or views are deleted by sweep() after idle_ttl seconds.
+    The user count is read once and kept up to date by add() and sweep().
+    """
+
+    def __init__(self, storage: SQLiteStorage, profile_type: type, idle_ttl: float):
+        self.storage = storage
+        self.profile_type = profile_type
+        self.idle_ttl = idle_ttl
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._count = storage.connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def add(self, user_profile: Any, anonymous: bool = False):
+        """Insert or replace a profile with its likes and viewing history"""
+        conn = self.storage.connection()
+        user_id = user_profile.user_id
+        with self._lock:
+            added = user_id not in self
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO users (user_id, preferred_styles, preferred_colors, "
+                    "interaction_weights, anonymous, last_active) VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, json.dumps(list(user_profile.preferred_styles)),
+                     json.dumps(list(user_profile.preferred_colors)),
+                     json.dumps(user_profile.interaction_weights), int(anonymous), time.time())
+                )
+                conn.execute("DELETE FROM likes WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM views WHERE user_id = ?", (user_id,))
+                conn.executemany("INSERT OR IGNORE INTO likes (user_id, artwork_id) VALUES (?, ?)",
+                                 [(user_id, artwork_id) for artwork_id in user_profile.liked_artworks])
+                conn.executemany("INSERT OR IGNORE INTO views (user_id, artwork_id) VALUES (?, ?)",
+                                 [(user_id, artwork_id) for artwork_id in user_profile.viewing_history])
+            self._count += added
+        if anonymous:
+            self.sweep()
+
+    def __setitem__(self, user_id: str, user_profile: Any):
+        self.add(user_profile)
+
+    def get(self, user_id: str, default: Optional[Any] = None) -> Optional[Any]:
+        conn = self.storage.connection()
+        row = conn.execute(
+            "SELECT preferred_styles, preferred_colors, interaction_weights FROM users WHERE user_id = ?",
+            (user_id,)).fetchone()
+        if row is None:
+            return default
+        styles, colors, weights = row
+        likes = conn.execute("SELECT artwork_id FROM likes WHERE user_id = ? ORDER BY rowid", (user_id,))
+        views = conn.execute("SELECT artwork_id FROM views WHERE user_id = ? ORDER BY rowid", (user_id,))
+        return self.profile_type(
+            user_id=user_id, preferred_styles=json.loads(styles), preferred_colors=json.loads(colors),
+            liked_artworks=[artwork_id for artwork_id, in likes],
+            viewing_history=[artwork_id for artwork_id, in views],
+            interaction_weights=json.loads(weights)
+        )
+
+    def __getitem__(self, user_id: str) -> Any:
+        user_profile = self.get(user_id)
+        if user_profile is None:
+            raise KeyError(user_id)
+        return user_profile
+
+    def __contains__(self, user_id: str) -> bool:
+        conn = self.storage.connection()
+        return conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        conn = self.storage.connection()
+        for user_id, in conn.execute("SELECT user_id FROM users ORDER BY rowid").fetchall():
+            user_profile = self.get(user_id)
+            if user_profile is not None:
+                yield user_id, user_profile
+
+    def record_interaction(self, user_id: str, artwork_id: str, interaction_type: str):
+        """Write a view, like or unlike already applied to a profile returned by get()"""
+        statement = {
+            "view": "INSERT OR IGNORE INTO views (user_id, artwork_id) VALUES (?, ?)",
+            "like": "INSERT OR IGNORE INTO likes (user_id, artwork_id) VALUES (?, ?)",
+            "unlike": "DELETE FROM likes WHERE user_id = ? AND artwork_id = ?"
+        }[interaction_type]
+        conn = self.storage.connection()
+        with conn:
+            conn.execute(statement, (user_id, artwork_id))
+            conn.execute("UPDATE users SET last_active = ? WHERE user_id = ?", (time.time(), user_id))
+
+    def save_preferences(self, user_profile: Any):
+        """Write back preferred styles and colors changed on a profile returned by get()"""
+        conn = self.storage.connection()
+        with conn:
+            conn.execute(
+                "UPDATE users SET preferred_styles = ?, preferred_colors = ?, last_active = ? WHERE user_id = ?",
+                (json.dumps(list(user_profile.preferred_styles)), json.dumps(list(user_profile.preferred_colors)),
+                 time.time(), user_profile.user_id)
+            )
+
+    def interaction_totals(self) -> Dict[str, int]:
+        conn = self.storage.connection()
+        return {
+            "views": conn.execute("SELECT COUNT(*) FROM views").fetchone()[0],
+            "likes": conn.execute("SELECT COUNT(*) FROM likes").fetchone()[0]
+        }
+
+    def sweep(self):
+        """Delete anonymous users idle past idle_ttl that never viewed or liked anything"""
+        conn = self.storage.connection()
+        with self._lock:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM users WHERE anonymous = 1 AND last_active < ? "
+                    "AND NOT EXISTS (SELECT 1 FROM likes WHERE likes.user_id = users.user_id) "
+                    "AND NOT EXISTS (SELECT 1 FROM views WHERE views.user_id = users.user_id)",
+                    (time.time() - self.idle_ttl,)
+                )
+            self._count -= cursor.rowcount
+            self.evicted += cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self), "evicted": self.evicted}
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+class UserStore:
+    """User profiles kept in memory up to a cap, evicting idle anonymous users first
+
+    Named users are never evicted. Anonymous users are dropped in least recently
+    used order once max_users is exceeded or after idle_ttl seconds without
+    access; those that differ from default_profile(user_id) are written to the
+    spill directory and loaded back the next time their id is looked up. With
+    no default_profile every evicted profile is spilled.
+
+    Idle users are evicted whenever a profile is added, and every
+    sweep_interval seconds by a background thread if one is given.
+    """
+
+    def __init__(self, profile_type: type, max_users: int = 10000, idle_ttl: float = 24 * 3600,
+                 spill_directory: Optional[str] = None,
+                 default_profile: Optional[Callable[[str], Any]] = None,
+                 sweep_interval: Optional[float] = None):
+        self.profile_type = profile_type  # dataclass that spilled JSON is loaded back into
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.spill_directory = spill_directory
+        self.default_profile = default_profile  # what a new session starts with
+        self.evicted = 0
+        self.restored = 0
+        self._users: Dict[str, Any] = {}
+        self._anonymous: "OrderedDict[str, float]" = OrderedDict()  # user id -> last access, oldest first
+        self._spilled_ids = set()
+        self._lock = threading.RLock()
+        if spill_directory:
+            os.makedirs(spill_directory, exist_ok=True)
+            self._scan()
+        self._closed = threading.Event()
+        if sweep_interval:
+            threading.Thread(target=self._sweep_periodically, args=(sweep_interval,),
+                             name="user-sweep", daemon=True).start()
+
+    def _scan(self):
+        """Find profiles spilled by previous runs"""
+        for name in os.listdir(self.spill_directory):
+            path = os.path.join(self.spill_directory, name)
+            if name.endswith('.tmp'):
+                # Interrupted write from a previous run
+                os.remove(path)
+            elif name.endswith('.json'):
+                try:
+                    with open(path) as f:
+                        self._spilled_ids.add(json.load(f)["user_id"])
+                except (OSError, ValueError, KeyError):
+                    pass
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.spill_directory, f"{hashlib.sha256(user_id.encode()).hexdigest()}.json")
+
+    def add(self, user_profile: Any, anonymous: bool = False):
+        """Store a profile; anonymous profiles are subject to eviction"""
+        with self._lock:
+            user_id = user_profile.user_id
+            self._discard_spilled(user_id)
+            self._users[user_id] = user_profile
+            self._anonymous.pop(user_id, None)
+            if anonymous:
+                self._anonymous[user_id] = time.time()
+            self._evict()
+
+    def __setitem__(self, user_id: str, user_profile: Any):
+        self.add(user_profile)
+
+    def get(self, user_id: str, default: Optional[Any] = None) -> Optional[Any]:
+        with self._lock:
+            if user_id in self._users:
+                if user_id in self._anonymous:
+                    self._anonymous[user_id] = time.time()
+                    self._anonymous.move_to_end(user_id)
+                return self._users[user_id]
+            if user_id in self._spilled_ids:
+                user_profile = self._restore(user_id)
+                if user_profile is not None:
+                    return user_profile
+            return default
+
+    def __getitem__(self, user_id: str) -> Any:
+        user_profile = self.get(user_id)
+        if user_profile is None:
+            raise KeyError(user_id)
+        return user_profile
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._users or user_id in self._spilled_ids
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._users) + len(self._spilled_ids)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Every profile, including spilled ones, without changing what is in memory"""
+        with self._lock:
+            in_memory = list(self._users.items())
+            spilled_ids = list(self._spilled_ids)
+        yield from in_memory
+        for user_id in spilled_ids:
+            user_profile = self._load(user_id)
+            if user_profile is not None:
+                yield user_id, user_profile
+
+    def _evict(self):
+        now = time.time()
+        while self._anonymous:
+            user_id, last_access = next(iter(self._anonymous.items()))
+            if len(self._users) <= self.max_users and now - last_access <= self.idle_ttl:
+                break
+            self._anonymous.popitem(last=False)
+            user_profile = self._users.pop(user_id)
+            self.evicted += 1
+            if self.spill_directory and self._worth_keeping(user_profile):
+                self._spill(user_profile)
+
+    def _worth_keeping(self, user_profile: Any) -> bool:
+        # Anything from likes to preferences that a new session would not start with
+        if self.default_profile is None:
+            return True
+        return asdict(user_profile) != asdict(self.default_profile(user_profile.user_id))
+
+    def _spill(self, user_profile: Any):
+        path = self._path(user_profile.user_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(user_profile), f)
+        os.replace(tmp_path, path)
+        self._spilled_ids.add(user_profile.user_id)
+
+    def _load(self, user_id: str) -> Optional[Any]:
+        try:
+            with open(self._path(user_id)) as f:
+                return self.profile_type(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _restore(self, user_id: str) -> Optional[Any]:
+        user_profile = self._load(user_id)
+        self._discard_spilled(user_id)
+        if user_profile is not None:
+            self.restored += 1
+            self.add(user_profile, anonymous=True)
+        return user_profile
+
+    def _discard_spilled(self, user_id: str):
+        if user_id in self._spilled_ids:
+            self._spilled_ids.discard(user_id)
+            try:
+                os.remove(self._path(user_id))
+            except OSError:
+                pass
+
+    def record_interaction(self, user_id: str, artwork_id: str, interaction_type: str):
+        """Nothing to write back: the profile returned by get() is the stored one"""
+
+    def save_preferences(self, user_profile: Any):
+        """Nothing to write back: the profile returned by get() is the stored one"""
+
+    def interaction_totals(self) -> Dict[str, int]:
+        """Views and likes summed over every profile, including spilled ones"""
+        totals = {"views": 0, "likes": 0}
+        for _, user_profile in self.items():
+            totals["views"] += len(user_profile.viewing_history)
+            totals["likes"] += len(user_profile.liked_artworks)
+        return totals
+
+    def sweep(self):
+        """Evict anonymous users that have been idle longer than idle_ttl"""
+        with self._lock:
+            self._evict()
+
+    def _sweep_periodically(self, interval: float):
+        while not self._closed.wait(interval):
+            self.sweep()
+
+    def close(self):
+        """Stop the background sweep"""
+        self._closed.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_memory": len(self._users),
+                "anonymous": len(self._anonymous),
+                "spilled": len(self._spilled_ids),
+                "max_users": self.max_users,
+                "evicted": self.evicted,
+                "restored": self.restored
+            }